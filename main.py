@@ -17,7 +17,8 @@ from src.utils import (
     setup_logging, 
     create_backup, 
     get_timestamp,
-    ensure_directories_exist
+    ensure_directories_exist,
+    EXCEL_READ_ENGINE
 )
 import pandas as pd
 
@@ -167,8 +168,8 @@ def main():
         validator = DataValidator(config)
         
         # Cargar archivos para validación
-        df_original = pd.read_excel(physical_params_file)
-        df_corrected = pd.read_excel(corrected_file)
+        df_original = pd.read_excel(physical_params_file, engine=EXCEL_READ_ENGINE)
+        df_corrected = pd.read_excel(corrected_file, engine=EXCEL_READ_ENGINE)
         
         validation_report_file = os.path.join(
             config['output_files']['reports_dir'],
@@ -4,6 +4,13 @@ import logging
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from collections import Counter, defaultdict
+from openpyxl import Workbook
+from src.utils import read_excel_sheets, iter_sheet_rows, load_sheets_cache, get_cache_dir, PANDAS_NA_STRINGS
+
+# Bits de procedencia de un valor encontrado
+SOURCE_CURRENT_FILE = 1
+SOURCE_TEMPLATE = 2
+SOURCE_PHYSICAL = 4
 
 class BlankFieldFiller:
     """
@@ -25,27 +32,25 @@ class BlankFieldFiller:
         # NUEVO: Cache para valores ya encontrados
         self.value_cache = {}  # {(station_id, field): value}
         
-        # Cargar template (una sola vez)
-        self.df_template = None
-        self.template_by_station = None
+        # Índice {(station_id, field): Counter} del archivo en proceso
+        self.current_index = None
+        
+        # Procedencia de valores por (station_id, field), como máscara de bits
+        self.source_bits = {}
+        
+        # Cargar template (una sola vez) como índice {(station_id, field): Counter}
+        self.template_index = None
         
         if template_file:
             try:
                 self.logger.info(f"Cargando template: {template_file}")
-                template_sheets = pd.read_excel(template_file, sheet_name=None)
-                self.df_template = pd.concat(template_sheets.values(), ignore_index=True)
-                
-                if 'station_id' in self.df_template.columns:
-                    self.template_by_station = self.df_template.groupby('station_id')
-                    self.logger.info(f"✓ Template cargado: {len(self.df_template)} filas")
-                else:
-                    self.logger.warning("Columna 'station_id' no encontrada en template")
+                self.template_index = self._stream_station_index(template_file, self.target_fields)
+                self.logger.info(f"✓ Template cargado: {len(self.template_index)} pares estación/campo")
             except Exception as e:
                 self.logger.warning(f"No se pudo cargar template: {e}")
         
         # NUEVO: Physical parameters cargado una sola vez
-        self.df_physical = None
-        self.physical_by_station = None
+        self.physical_index = None
         
         # Estadísticas
         self.stats = {
@@ -60,57 +65,207 @@ class BlankFieldFiller:
         """
         Carga physical parameters UNA SOLA VEZ
         """
-        if self.df_physical is not None:
+        if self.physical_index is not None:
             return  # Ya está cargado
         
         try:
             self.logger.info(f"Cargando physical parameters: {physical_file}")
-            physical_sheets = pd.read_excel(physical_file, sheet_name=None)
-            self.df_physical = pd.concat(physical_sheets.values(), ignore_index=True)
-            
-            if 'station_id' in self.df_physical.columns:
-                self.physical_by_station = self.df_physical.groupby('station_id')
-                self.logger.info(f"✓ Physical parameters cargado: {len(self.df_physical)} filas")
-            else:
-                self.logger.warning("Columna 'station_id' no encontrada en physical")
+            self.physical_index = self._stream_station_index(physical_file, self.target_fields)
+            self.logger.info(f"✓ Physical parameters cargado: {len(self.physical_index)} pares estación/campo")
         except Exception as e:
             self.logger.warning(f"No se pudo cargar physical parameters: {e}")
     
+    def _stream_station_index(self, path: str, fields: List[str]) -> Dict[tuple, Counter]:
+        """
+        Lee un workbook en modo streaming (calamine u openpyxl read_only) y
+        construye un índice {(station_id, field): Counter(valores no vacíos)}
+        
+        Evita materializar DataFrames completos: el template y physical
+        parameters solo se usan como tablas de búsqueda por station_id.
+        
+        Args:
+            path: Ruta al archivo Excel
+            fields: Campos a indexar
+            
+        Returns:
+            Diccionario con los conteos de valores por estación y campo
+        """
+        index = defaultdict(Counter)
+        
+        for sheet_name, rows in iter_sheet_rows(path):
+            header = next(rows, None)
+            
+            if not header or 'station_id' not in header:
+                self.logger.warning(f"Columna 'station_id' no encontrada en hoja '{sheet_name}' de {path}")
+                continue
+            
+            sid_pos = header.index('station_id')
+            field_pos = [(field, header.index(field)) for field in fields if field in header]
+            
+            # Los textos de na_values de pandas ('N/A', 'NULL', ...) cuentan como vacíos,
+            # igual que al leer con pd.read_excel
+            for row in rows:
+                station_id = row[sid_pos]
+                if station_id is None or station_id in PANDAS_NA_STRINGS:
+                    continue
+                
+                for field, pos in field_pos:
+                    value = row[pos]
+                    if value in PANDAS_NA_STRINGS or self.is_blank(value):
+                        continue
+                    index[(station_id, field)][value] += 1
+        
+        return dict(index)
+    
+    def _load_cached_sheets(self, input_file: str) -> Optional[Dict]:
+        """
+        Hojas del archivo desde el caché del motor de corrección, si está activado
+        
+        Args:
+            input_file: Ruta al archivo Excel
+            
+        Returns:
+            Diccionario de hojas o None (caché desactivado o inexistente)
+        """
+        cache_dir = get_cache_dir(self.config)
+        if not cache_dir:
+            return None
+        return load_sheets_cache(input_file, cache_dir)
+    
+    def _build_station_index(self, all_sheets: Dict) -> Dict[tuple, Counter]:
+        """
+        Construye el índice {(station_id, field): Counter} del archivo actual
+        directamente desde cada hoja, sin concatenarlas
+        
+        Args:
+            all_sheets: Diccionario con todas las hojas del archivo actual
+            
+        Returns:
+            Diccionario con los conteos de valores no vacíos por estación y campo
+        """
+        index = defaultdict(Counter)
+        
+        for df_sheet in all_sheets.values():
+            if 'station_id' not in df_sheet.columns:
+                continue
+            
+            for field in self.target_fields:
+                if field not in df_sheet.columns:
+                    continue
+                
+                # Conteo por (station_id, valor) en un solo groupby, sin blancos.
+                # Posiciones no vacías vía flatnonzero: sin construir un sub-DataFrame
+                keep = np.flatnonzero(~self._blank_mask(df_sheet[field]))
+                values = df_sheet[field].iloc[keep]
+                station_ids = df_sheet['station_id'].iloc[keep]
+                counts = values.groupby([station_ids, values], sort=False, observed=True).size()
+                
+                for (station_id, value), count in counts.items():
+                    index[(station_id, field)][value] += int(count)
+        
+        return dict(index)
+    
+    def _categorize_station_ids(self, all_sheets: Dict):
+        """
+        Convierte station_id a dtype categórico en cada hoja (in place)
+        
+        Los groupby y comparaciones por estación trabajan sobre códigos
+        enteros en lugar de strings.
+        """
+        for df_sheet in all_sheets.values():
+            if 'station_id' in df_sheet.columns:
+                df_sheet['station_id'] = df_sheet['station_id'].astype('category')
+    
     def is_blank(self, value) -> bool:
         """
         Verifica si un valor está en blanco
+        
+        Despacha por tipo para evitar pd.isna y str() en los casos comunes.
         """
-        if pd.isna(value):
-            return True
+        if isinstance(value, str):
+            stripped = value.strip()
+            return stripped == '' or stripped == '-'
         if value is None:
             return True
-        if str(value).strip() == '':
-            return True
-        if str(value).strip() == '-':
-            return True
-        return False
+        if isinstance(value, float):
+            return value != value  # NaN
+        if isinstance(value, int):
+            return False
+        
+        # Otros escalares (pd.NA, NaT, tipos numpy): blanco solo si es NA
+        try:
+            return bool(pd.isna(value))
+        except (TypeError, ValueError):
+            return False
+    
+    def _blank_mask(self, s: pd.Series) -> np.ndarray:
+        """
+        Versión vectorizada de is_blank para una columna completa
+        
+        is_blank se evalúa solo sobre los valores únicos de la columna
+        (pd.factorize) y el resultado se expande a todas las filas como
+        tabla de búsqueda indexada por código.
+        
+        Args:
+            s: Serie a evaluar
+            
+        Returns:
+            Array booleano con True donde el valor está en blanco
+        """
+        # Columnas numéricas/fecha no pueden contener strings: solo NA es blanco
+        if s.dtype.kind in 'biufMm':
+            return s.isna().to_numpy()
+        
+        codes, uniques = pd.factorize(s)
+        
+        # El código -1 (NA) indexa el último elemento, que siempre es blanco
+        blank_lut = np.fromiter(
+            (self.is_blank(u) for u in uniques), dtype=bool, count=len(uniques)
+        )
+        blank_lut = np.append(blank_lut, True)
+        
+        return np.take(blank_lut, codes)
     
-    def get_most_common_value(self, values: List[Any]) -> Optional[Any]:
+    def get_most_common_value(self, values) -> Optional[Any]:
         """
-        Obtiene el valor más frecuente de una lista
+        Obtiene el valor más frecuente de una lista o de un Counter ya construido
         """
         if not values:
             return None
         
-        counter = Counter(values)
+        counter = values if isinstance(values, Counter) else Counter(values)
         most_common = counter.most_common(1)[0][0]
         return most_common
     
-    def find_value_for_station_field(self, station_id: str, field: str, 
-                                     all_sheets: Dict) -> Optional[Any]:
+    def _build_source_bits(self) -> Dict[tuple, int]:
+        """
+        Registra en qué fuentes existe un valor para cada (station_id, field)
+        
+        Returns:
+            Diccionario {(station_id, field): bits} combinando SOURCE_CURRENT_FILE,
+            SOURCE_TEMPLATE y SOURCE_PHYSICAL
+        """
+        source_bits = defaultdict(int)
+        
+        for bit, source_index in ((SOURCE_CURRENT_FILE, self.current_index),
+                                  (SOURCE_TEMPLATE, self.template_index),
+                                  (SOURCE_PHYSICAL, self.physical_index)):
+            for key in source_index or ():
+                source_bits[key] |= bit
+        
+        return dict(source_bits)
+    
+    def find_value_for_station_field(self, station_id: str, field: str) -> Optional[Any]:
         """
         Busca valor para un station_id y field en TODAS las fuentes
         Usa caché para evitar búsquedas repetidas
         
+        Orden de búsqueda: archivo actual (current_index), template y
+        physical parameters.
+        
         Args:
             station_id: ID de la estación
             field: Nombre del campo
-            all_sheets: Diccionario con todas las hojas del archivo actual
             
         Returns:
             Valor encontrado o None
@@ -120,96 +275,68 @@ class BlankFieldFiller:
         if cache_key in self.value_cache:
             return self.value_cache[cache_key]
         
-        value = None
-        
         # 1. Buscar en todas las hojas del archivo actual
-        all_values = []
-        for sheet_name, df_sheet in all_sheets.items():
-            if field not in df_sheet.columns:
+        # 2. Buscar en template, 3. Buscar en physical parameters
+        for source_index in (self.current_index, self.template_index, self.physical_index):
+            if not source_index:
                 continue
             
-            mask = df_sheet['station_id'] == station_id
-            sheet_values = df_sheet.loc[mask, field]
-            
-            # Agregar valores no vacíos
-            non_blank = [v for v in sheet_values if not self.is_blank(v)]
-            all_values.extend(non_blank)
-        
-        if all_values:
-            value = self.get_most_common_value(all_values)
-            self.value_cache[cache_key] = value
-            return value
-        
-        # 2. Buscar en template
-        if self.template_by_station is not None:
-            try:
-                station_data = self.template_by_station.get_group(station_id)
-                
-                if field in station_data.columns:
-                    non_blank_values = [v for v in station_data[field] if not self.is_blank(v)]
-                    
-                    if non_blank_values:
-                        value = self.get_most_common_value(non_blank_values)
-                        self.value_cache[cache_key] = value
-                        return value
-            except KeyError:
-                pass
-        
-        # 3. Buscar en physical parameters
-        if self.physical_by_station is not None:
-            try:
-                station_data = self.physical_by_station.get_group(station_id)
-                
-                if field in station_data.columns:
-                    non_blank_values = [v for v in station_data[field] if not self.is_blank(v)]
-                    
-                    if non_blank_values:
-                        value = self.get_most_common_value(non_blank_values)
-                        self.value_cache[cache_key] = value
-                        return value
-            except KeyError:
-                pass
+            value = self.get_most_common_value(source_index.get(cache_key))
+            if value is not None:
+                self.value_cache[cache_key] = value
+                return value
         
         # No se encontró valor
         self.value_cache[cache_key] = None
         return None
     
-    def fill_blanks_in_sheet(self, sheet_name: str, df_sheet: pd.DataFrame, 
-                            all_sheets: Dict) -> pd.DataFrame:
+    def fill_blanks_in_sheet(self, sheet_name: str, df_sheet: pd.DataFrame) -> pd.DataFrame:
         """
         Rellena campos en blanco en una hoja específica (OPTIMIZADO)
         
         Args:
             sheet_name: Nombre de la hoja
             df_sheet: DataFrame de la hoja
-            all_sheets: Diccionario con todas las hojas
             
         Returns:
             DataFrame con campos rellenados
         """
         self.logger.info(f"Procesando hoja: {sheet_name}")
         
-        df_filled = df_sheet.copy()
+        # Campos objetivo presentes en la hoja y su posición de columna
+        present_fields = [f for f in self.target_fields if f in df_sheet.columns]
+        col_pos = {field: df_sheet.columns.get_loc(field) for field in present_fields}
+        
+        # Copia superficial: las columnas rellenadas se reemplazan completas al final
+        df_filled = df_sheet.copy(deep=False)
         
         # Verificar columnas necesarias
         if 'station_id' not in df_filled.columns:
             self.logger.warning(f"  ⚠️  Hoja {sheet_name} no tiene columna 'station_id', saltando")
             return df_filled
         
+        # Máscara de blancos por campo, calculada una sola vez por hoja
+        blank_masks = {
+            field: self._blank_mask(df_filled.iloc[:, col_pos[field]])
+            for field in present_fields
+        }
+        
+        # Posiciones de fila por estación (una sola pasada sobre la columna)
+        station_rows = df_filled.groupby('station_id', sort=False, observed=True).indices
+        
         # OPTIMIZACIÓN: Pre-identificar qué campos tienen blancos por estación
         stations_with_blanks = defaultdict(list)  # {station_id: [fields_with_blanks]}
         
-        for field in self.target_fields:
-            if field not in df_filled.columns:
-                continue
+        station_ids = df_filled['station_id']
+        
+        for field, blank_mask in blank_masks.items():
+            # Identificar estaciones con blancos en este campo (un groupby por campo)
+            blanks_per_station = pd.Series(blank_mask, index=df_filled.index).groupby(
+                station_ids, sort=False, observed=True
+            ).sum()
             
-            # Identificar estaciones con blancos en este campo
-            for station_id in df_filled['station_id'].unique():
-                mask = df_filled['station_id'] == station_id
-                blank_mask = mask & df_filled[field].apply(self.is_blank)
-                
-                if blank_mask.any():
-                    stations_with_blanks[station_id].append(field)
+            for station_id in blanks_per_station[blanks_per_station > 0].index:
+                stations_with_blanks[station_id].append(field)
         
         if not stations_with_blanks:
             self.logger.info(f"  ✓ Hoja {sheet_name}: sin campos en blanco")
@@ -218,28 +345,33 @@ class BlankFieldFiller:
         # Procesar solo estaciones con blancos
         fill_count = 0
         
+        # Valores a escribir por campo (una sola escritura por columna al final)
+        fill_values = {field: np.empty(len(df_filled), dtype=object) for field in present_fields}
+        fill_masks = {field: np.zeros(len(df_filled), dtype=bool) for field in present_fields}
+        
         for station_id, fields_to_fill in stations_with_blanks.items():
+            rows = station_rows[station_id]
+            
             for field in fields_to_fill:
-                mask = df_filled['station_id'] == station_id
-                blank_mask = mask & df_filled[field].apply(self.is_blank)
-                blank_count = blank_mask.sum()
+                blank_rows = rows[blank_masks[field][rows]]
+                blank_count = len(blank_rows)
                 
                 self.stats['total_blanks_found'] += blank_count
                 
                 # Buscar valor (usa caché automáticamente)
-                new_value = self.find_value_for_station_field(station_id, field, all_sheets)
+                new_value = self.find_value_for_station_field(station_id, field)
                 
                 if new_value:
-                    df_filled.loc[blank_mask, field] = new_value
+                    fill_values[field][blank_rows] = new_value
+                    fill_masks[field][blank_rows] = True
                     fill_count += blank_count
                     
                     # Determinar fuente para estadísticas
-                    if any(not self.is_blank(v) for df in all_sheets.values() 
-                          if field in df.columns 
-                          for v in df.loc[df['station_id'] == station_id, field]):
+                    bits = self.source_bits.get((station_id, field), 0)
+                    if bits & SOURCE_CURRENT_FILE:
                         self.stats['filled_from_same_site'] += blank_count
                         source = "mismo archivo"
-                    elif self.template_by_station is not None:
+                    elif bits & SOURCE_TEMPLATE:
                         self.stats['filled_from_template'] += blank_count
                         source = "template"
                     else:
@@ -255,6 +387,12 @@ class BlankFieldFiller:
                         f"  ⚠️  {station_id}.{field}: {blank_count} valores sin fuente"
                     )
         
+        for field, fill_mask in fill_masks.items():
+            if fill_mask.any():
+                col_values = df_filled.iloc[:, col_pos[field]].to_numpy(dtype=object, copy=True)
+                col_values[fill_mask] = fill_values[field][fill_mask]
+                df_filled[field] = col_values
+        
         self.logger.info(f"  ✓ Hoja {sheet_name}: {fill_count} campos rellenados")
         
         return df_filled
@@ -278,34 +416,51 @@ class BlankFieldFiller:
         
         # Cargar todas las hojas del archivo a procesar
         self.logger.info(f"Cargando archivo: {input_file}")
-        all_sheets = pd.read_excel(input_file, sheet_name=None)
+        all_sheets = self._load_cached_sheets(input_file)
+        if all_sheets is not None:
+            self.logger.info("✓ Hojas cargadas desde caché del motor de corrección")
+        else:
+            all_sheets = read_excel_sheets(input_file)
+        self._categorize_station_ids(all_sheets)
         self.logger.info(f"Hojas encontradas: {list(all_sheets.keys())}")
         
+        # Indexar valores no vacíos del archivo una sola vez
+        self.current_index = self._build_station_index(all_sheets)
+        self.source_bits = self._build_source_bits()
+        self.value_cache = {}
+        
         # Procesar cada hoja
         filled_sheets = {}
         
         for sheet_name, df_sheet in all_sheets.items():
-            filled_sheets[sheet_name] = self.fill_blanks_in_sheet(
-                sheet_name, 
-                df_sheet, 
-                all_sheets
-            )
+            filled_sheets[sheet_name] = self.fill_blanks_in_sheet(sheet_name, df_sheet)
         
         # Guardar archivo completado
         self.logger.info(f"\nGuardando archivo completado: {output_file}")
         
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            for sheet_name, df_sheet in filled_sheets.items():
-                # Actualizar metadatos
-                if 'db_modified_by_user' in df_sheet.columns:
-                    df_sheet['db_modified_by_user'] = 'blank_field_filler'
-                if 'db_modification_datetime' in df_sheet.columns:
-                    df_sheet['db_modification_datetime'] = timestamp
-                
-                df_sheet.to_excel(writer, sheet_name=sheet_name, index=False)
-                self.logger.info(f"  ✓ Hoja '{sheet_name}' guardada")
+        # Workbook write-only: las filas se escriben en streaming al archivo
+        workbook = Workbook(write_only=True)
+        
+        for sheet_name, df_sheet in filled_sheets.items():
+            # Actualizar metadatos
+            if 'db_modified_by_user' in df_sheet.columns:
+                df_sheet['db_modified_by_user'] = 'blank_field_filler'
+            if 'db_modification_datetime' in df_sheet.columns:
+                df_sheet['db_modification_datetime'] = timestamp
+            
+            # NaN/NaT -> None para que openpyxl deje la celda vacía
+            df_out = df_sheet.astype(object).where(df_sheet.notna(), None)
+            
+            ws = workbook.create_sheet(sheet_name)
+            ws.append(list(df_out.columns))
+            for row in df_out.itertuples(index=False, name=None):
+                ws.append(row)
+            
+            self.logger.info(f"  ✓ Hoja '{sheet_name}' guardada")
+        
+        workbook.save(output_file)
         
         self.logger.info(f"✓ Archivo guardado: {output_file}")
         
@@ -338,9 +493,12 @@ class BlankFieldFiller:
         """
         self.logger.info("Generando reporte de campos en blanco...")
         
-        all_sheets = pd.read_excel(input_file, sheet_name=None)
+        all_sheets = self._load_cached_sheets(input_file)
+        if all_sheets is None:
+            all_sheets = read_excel_sheets(input_file)
+        self._categorize_station_ids(all_sheets)
         
-        blank_records = []
+        blank_frames = []
         
         for sheet_name, df_sheet in all_sheets.items():
             if 'station_id' not in df_sheet.columns:
@@ -351,26 +509,24 @@ class BlankFieldFiller:
                 if field not in df_sheet.columns:
                     continue
                 
-                # Agrupar y contar de una vez
-                grouped = df_sheet.groupby('station_id').apply(
-                    lambda x: pd.Series({
-                        'blank_count': x[field].apply(self.is_blank).sum(),
-                        'total_count': len(x)
-                    })
-                )
+                # Agrupar y contar de una vez (suma de blancos y total por estación)
+                blank_mask = pd.Series(self._blank_mask(df_sheet[field]), index=df_sheet.index)
+                grouped = blank_mask.groupby(df_sheet['station_id'], observed=True).agg(['sum', 'count'])
+                grouped = grouped[grouped['sum'] > 0]
+                
+                if len(grouped) == 0:
+                    continue
                 
-                for station_id, row in grouped.iterrows():
-                    if row['blank_count'] > 0:
-                        blank_records.append({
-                            'sheet': sheet_name,
-                            'station_id': station_id,
-                            'field': field,
-                            'blank_count': int(row['blank_count']),
-                            'total_sectors': int(row['total_count']),
-                            'blank_percentage': (row['blank_count'] / row['total_count'] * 100)
-                        })
-        
-        df_report = pd.DataFrame(blank_records)
+                blank_frames.append(pd.DataFrame({
+                    'sheet': sheet_name,
+                    'station_id': grouped.index.astype(object),
+                    'field': field,
+                    'blank_count': grouped['sum'].astype(int).to_numpy(),
+                    'total_sectors': grouped['count'].astype(int).to_numpy(),
+                    'blank_percentage': (grouped['sum'] / grouped['count'] * 100).to_numpy()
+                }))
+        
+        df_report = pd.concat(blank_frames, ignore_index=True) if blank_frames else pd.DataFrame()
         
         if len(df_report) > 0:
             df_report = df_report.sort_values(['station_id', 'field'])
@@ -1,9 +1,25 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from collections import Counter
+import os
 import re
 import logging
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import Workbook
+from src.utils import (
+    read_excel_sheets,
+    save_sheets_cache,
+    get_cache_dir,
+    EXCEL_READ_ENGINE,
+    EXCEL_WRITE_ENGINE,
+    XLSXWRITER_AVAILABLE,
+    XLSXWRITER_STRING_OPTIONS,
+    PYARROW_AVAILABLE
+)
+
+if XLSXWRITER_AVAILABLE:
+    import xlsxwriter
 
 # Importar los nuevos módulos con manejo de errores
 try:
@@ -14,6 +30,99 @@ except ImportError:
     MODULES_AVAILABLE = False
     logging.warning("TemplateManager y/o ExtendedCellDetector no disponibles")
 
+# Patrón de elementos en celdas con formato de lista: '...', "..." o números
+LIST_VALUES_PATTERN = re.compile(r"'([^']*)'|\"([^\"]*)\"|(-?\d+\.?\d*)")
+
+# Columnas del archivo de anomalías con listas de valores (en orden de reporte)
+LIST_FIELDS = ['latitude', 'longitude', 'name', 'structure_height',
+               'structure_owner', 'structure_type']
+
+# Columnas copiadas por search_sector_info_all_sheets para cada sector encontrado
+SECTOR_INFO_COLUMNS = ['station_id', 'sector_id', 'name', 'latitude', 'longitude',
+                       'structure_height', 'structure_owner', 'structure_type']
+
+def _is_empty(value):
+    """
+    Indica si un valor escalar está en blanco (None, NA/NaN/NaT o string vacío)
+
+    Equivale a `pd.isna(v) or v == ''` para escalares, sin pasar por pd.isna.
+    """
+    if value is None or value is pd.NA or value is pd.NaT:
+        return True
+    if isinstance(value, (float, np.floating)):
+        return value != value
+    return isinstance(value, str) and value == ''
+
+def _all_equal(values, value):
+    """
+    Indica si todas las filas de una columna ya tienen el valor dado
+
+    Compara el array directamente (sin unique); equivale a
+    `s.nunique(dropna=False) == 1 and s.iloc[0] == value`.
+    """
+    array = values.to_numpy()
+    if array.size == 0:
+        return False
+    if pd.api.types.is_scalar(value):
+        try:
+            return bool(np.all(array == value))
+        except (TypeError, ValueError):
+            pass
+    # Comparación ambigua (pd.NA, valores no escalares): criterio original
+    return values.nunique(dropna=False) == 1 and bool(values.iloc[0] == value)
+
+
+# Columnas de baja cardinalidad que se guardan como categóricas
+CATEGORICAL_COLUMNS = ['structure_owner', 'structure_type', 'cell_type']
+
+# Identificadores de texto (nunca se corrigen) que se guardan como strings Arrow
+ARROW_STRING_COLUMNS = ['station_id', 'station_cell_id', 'sector_id']
+
+# Columnas del log de correcciones (registros de apply_corrections)
+CORRECTION_LOG_COLUMNS = ['station_id', 'sheet_name', 'parameter', 'old_values',
+                          'new_value', 'rows_affected', 'timestamp', 'source']
+
+
+# Motor de solo lectura en cada proceso worker (ver process_anomalous_file)
+_WORKER_ENGINE = None
+
+
+def _init_station_worker(engine):
+    """
+    Inicializa un proceso worker con una copia del motor (se envía una sola vez)
+
+    Args:
+        engine: Instancia de RFDataCorrectionEngine
+    """
+    global _WORKER_ENGINE
+    _WORKER_ENGINE = engine
+
+
+def _evaluate_station_worker(task):
+    """
+    Determina los valores correctos de una estación en un proceso worker
+
+    Args:
+        task: Tupla (row, parsed_values, discrepancy_scores, best_values, extended_cells)
+
+    Returns:
+        Tupla (correct_values, revisiones manuales, extended cells, traceback o None)
+    """
+    row, parsed_values, discrepancy_scores, best_values, extended_cells = task
+    engine = _WORKER_ENGINE
+    engine.manual_review_required = []
+    engine.extended_cells_detected = []
+
+    try:
+        correct_values = engine.process_anomalous_station(
+            row, parsed_values, discrepancy_scores, best_values, extended_cells
+        )
+    except Exception:
+        return None, [], [], traceback.format_exc()
+
+    return correct_values, engine.manual_review_required, engine.extended_cells_detected, None
+
+
 class RFDataCorrectionEngine:
     """
     Motor de corrección automática de datos de sitios RF
@@ -32,17 +141,73 @@ class RFDataCorrectionEngine:
         self.config = config
         self.physical_params_file = physical_params_file
 
+        # Parámetros de configuración usados por estación (se resuelven una sola vez)
+        self._structure_type_priority = dict(config.get('structure_type_priority') or {})
+        self._lat_range = (config['geographic_validation']['latitude_min'],
+                           config['geographic_validation']['latitude_max'])
+        self._lon_range = (config['geographic_validation']['longitude_min'],
+                           config['geographic_validation']['longitude_max'])
+        self._height_range = (config['structure_validation']['height_min'],
+                              config['structure_validation']['height_max'])
+        self._manual_review_threshold = config['processing']['require_manual_review_threshold']
+
         self.logger.info(f"Cargando archivo: {physical_params_file}")
 
         # Cargar TODAS las hojas del archivo
-        self.all_sheets = pd.read_excel(physical_params_file, sheet_name=None)
+        self.all_sheets = read_excel_sheets(physical_params_file, engine=EXCEL_READ_ENGINE)
         self.logger.info(f"Hojas encontradas: {list(self.all_sheets.keys())}")
 
-        # Combinar todas las hojas en un solo DataFrame
-        self.df_physical = pd.concat(self.all_sheets.values(), ignore_index=True)
-        self.logger.info(f"Total de filas cargadas: {len(self.df_physical)}")
+        total_rows = sum(len(df_sheet) for df_sheet in self.all_sheets.values())
+        self.logger.info(f"Total de filas cargadas: {total_rows}")
+
+        # Columnas de texto de baja cardinalidad como categóricas (menos memoria)
+        for df_sheet in self.all_sheets.values():
+            for col in CATEGORICAL_COLUMNS:
+                if col in df_sheet.columns and not pd.api.types.is_numeric_dtype(df_sheet[col]):
+                    df_sheet[col] = df_sheet[col].astype('category')
+
+            # Identificadores en object (pandas 2) como strings Arrow, para que
+            # .str.match / isin corran en C++; solo si todos los valores son texto
+            if PYARROW_AVAILABLE:
+                for col in ARROW_STRING_COLUMNS:
+                    if (col in df_sheet.columns and df_sheet[col].dtype == object
+                            and pd.api.types.infer_dtype(df_sheet[col], skipna=True) == 'string'):
+                        df_sheet[col] = df_sheet[col].astype('string[pyarrow]')
+
+        # Nombres de hoja por minúsculas (p.ej. 'lte' -> 'LTE')
+        self._sheet_name_by_lower = {}
+        for sheet_name in self.all_sheets:
+            self._sheet_name_by_lower.setdefault(sheet_name.lower(), sheet_name)
+
+        # Posición de cada columna por hoja ({hoja: {columna: posición}}).
+        # Las correcciones no agregan columnas, por lo que no cambia.
+        self._sheet_col_locs = {
+            sheet_name: {col: pos for pos, col in enumerate(df_sheet.columns)}
+            for sheet_name, df_sheet in self.all_sheets.items()
+        }
 
-        self.corrections_log = []
+        # Índice {station_id: posiciones de fila} por hoja, construido una sola vez.
+        # station_id nunca se modifica, por lo que el índice sigue siendo válido.
+        self._sheet_indexes = {
+            sheet_name: (df_sheet.groupby('station_id', sort=False).indices
+                         if 'station_id' in self._sheet_col_locs[sheet_name] else {})
+            for sheet_name, df_sheet in self.all_sheets.items()
+        }
+
+        # Mapa {station_id: [(hoja, posiciones de fila), ...]} en orden de hojas,
+        # para visitar solo las hojas donde aparece cada estación
+        self._station_locations = {}
+        for sheet_name, sheet_index in self._sheet_indexes.items():
+            for station_id, rows in sheet_index.items():
+                self._station_locations.setdefault(station_id, []).append((sheet_name, rows))
+
+        self.corrections_log = pd.DataFrame()
+        self._correction_rows = []
+        # Timestamp único de la ejecución de process_anomalous_file (None fuera de ella)
+        self._run_timestamp = None
+        # Escrituras diferidas {(hoja, columna): ([posiciones], [valores], [registros])};
+        # None = apply_corrections escribe de inmediato
+        self._pending_writes = None
         self.manual_review_required = []
         self.extended_cells_detected = []
         
@@ -72,11 +237,49 @@ class RFDataCorrectionEngine:
         # Validación de columnas requeridas
         required_columns = ['station_id', 'name', 'latitude', 'longitude',
                           'structure_height', 'structure_owner', 'structure_type']
-        missing_columns = [col for col in required_columns if col not in self.df_physical.columns]
+        available_columns = set()
+        for col_locs in self._sheet_col_locs.values():
+            available_columns.update(col_locs)
+        missing_columns = [col for col in required_columns if col not in available_columns]
 
         if missing_columns:
             raise ValueError(f"Columnas faltantes en el archivo: {missing_columns}")
     
+    @property
+    def df_physical(self):
+        """
+        DataFrame consolidado de todas las hojas, construido bajo demanda
+
+        Returns:
+            Concatenación de self.all_sheets (refleja las correcciones aplicadas)
+        """
+        return pd.concat(self.all_sheets.values(), ignore_index=True)
+
+    def get_station_rows(self, sheet_name, station_id):
+        """
+        Obtiene las posiciones de fila de una estación en una hoja
+
+        Args:
+            sheet_name: Nombre de la hoja
+            station_id: ID de la estación
+
+        Returns:
+            Array de posiciones (para usar con .iloc) o None si no hay filas
+        """
+        return self._sheet_indexes.get(sheet_name, {}).get(station_id)
+
+    def get_station_locations(self, station_id):
+        """
+        Obtiene las hojas donde aparece una estación y sus posiciones de fila
+
+        Args:
+            station_id: ID de la estación
+
+        Returns:
+            Lista de tuplas (nombre_hoja, posiciones) en el orden de las hojas
+        """
+        return self._station_locations.get(station_id, [])
+
     def parse_list_values(self, value_str):
         """
         Convierte strings de listas a listas Python
@@ -87,17 +290,53 @@ class RFDataCorrectionEngine:
         Returns:
             Lista de valores parseados
         """
+        # Valores numéricos: sin regex (NaN = lista vacía)
+        if isinstance(value_str, (int, float, np.integer, np.floating)):
+            return [] if value_str != value_str else [value_str]
+        
+        # Listas ya construidas (p.ej. datos generados en el mismo proceso)
+        if isinstance(value_str, (list, tuple)):
+            return [v for v in value_str if not _is_empty(v)]
+        
         if pd.isna(value_str) or value_str == '[]':
             return []
         
         if isinstance(value_str, str):
             # Intentar parsear como lista
-            matches = re.findall(r"'([^']*)'|\"([^\"]*)\"|(-?\d+\.?\d*)", value_str)
-            values = [m[0] or m[1] or m[2] for m in matches if any(m)]
+            values = (m.group(1) or m.group(2) or m.group(3)
+                      for m in LIST_VALUES_PATTERN.finditer(value_str))
             return [v for v in values if v]
         
         return [value_str]
     
+    def parse_list_values_series(self, values):
+        """
+        Versión por columna de parse_list_values: parsea todas las filas de una vez
+
+        Args:
+            values: Serie con strings de listas o valores únicos
+
+        Returns:
+            Serie de listas de valores parseados
+        """
+        parsed = pd.Series([[] for _ in range(len(values))], index=values.index, dtype=object)
+
+        # Strings: un solo findall vectorizado sobre la columna
+        is_str = values.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+        matches = values[is_str].astype(str).str.findall(LIST_VALUES_PATTERN)
+        parsed[is_str] = matches.map(lambda ms: [m[0] or m[1] or m[2] for m in ms if any(m)])
+
+        # Listas ya construidas: sin regex
+        is_list = values.map(lambda v: isinstance(v, (list, tuple))).to_numpy(dtype=bool)
+        if is_list.any():
+            parsed[is_list] = values[is_list].map(self.parse_list_values)
+
+        # Escalares no nulos: lista de un elemento
+        is_scalar = ~is_str & ~is_list & values.notna().to_numpy()
+        parsed[is_scalar] = values[is_scalar].map(lambda v: [v])
+
+        return parsed
+
     def normalize_owner(self, owner):
         """
         Normaliza nombres de propietarios de estructuras
@@ -112,6 +351,33 @@ class RFDataCorrectionEngine:
             return None
         return owner.upper().strip()
     
+    def _bounded_floats(self, value_list, vmin, vmax, label):
+        """
+        Convierte una lista de valores a float64 y filtra por rango [vmin, vmax]
+
+        Args:
+            value_list: Lista de valores (los vacíos se ignoran)
+            vmin, vmax: Límites del rango válido
+            label: Nombre del parámetro para los mensajes de log
+
+        Returns:
+            Array con los valores dentro del rango, o None si hay valores inválidos
+            o ninguno cae en el rango
+        """
+        try:
+            values = np.fromiter((float(x) for x in value_list if x), dtype=np.float64)
+        except ValueError:
+            self.logger.warning(f"Valores de {label} inválidos: {value_list}")
+            return None
+
+        valid = values[(values >= vmin) & (values <= vmax)]
+
+        if valid.size == 0:
+            self.logger.warning(f"Ninguna {label} dentro del rango válido: {values.tolist()}")
+            return None
+
+        return valid
+
     def select_best_latitude(self, lat_list):
         """
         Selecciona la mejor latitud del conjunto usando validación geográfica
@@ -125,27 +391,13 @@ class RFDataCorrectionEngine:
         if not lat_list:
             return None
         
-        try:
-            lats = [float(x) for x in lat_list if x]
-        except ValueError:
-            self.logger.warning(f"Valores de latitud inválidos: {lat_list}")
-            return None
-        
         # Validar rango geográfico
-        lat_min = self.config['geographic_validation']['latitude_min']
-        lat_max = self.config['geographic_validation']['latitude_max']
-        valid_lats = [x for x in lats if lat_min <= x <= lat_max]
+        valid_lats = self._bounded_floats(lat_list, *self._lat_range, 'latitud')
         
-        if not valid_lats:
-            self.logger.warning(f"Ninguna latitud dentro del rango válido: {lats}")
+        if valid_lats is None:
             return None
         
-        # Si valores muy cercanos, usar mediana
-        threshold = self.config['coordinate_threshold']
-        if max(valid_lats) - min(valid_lats) < threshold:
-            return round(np.median(valid_lats), 6)
-        
-        # Usar valor más frecuente o mediana
+        # Valores cercanos o dispersos: en ambos casos se usa la mediana
         return round(np.median(valid_lats), 6)
     
     def select_best_longitude(self, lon_list):
@@ -161,24 +413,11 @@ class RFDataCorrectionEngine:
         if not lon_list:
             return None
         
-        try:
-            lons = [float(x) for x in lon_list if x]
-        except ValueError:
-            self.logger.warning(f"Valores de longitud inválidos: {lon_list}")
-            return None
+        valid_lons = self._bounded_floats(lon_list, *self._lon_range, 'longitud')
         
-        lon_min = self.config['geographic_validation']['longitude_min']
-        lon_max = self.config['geographic_validation']['longitude_max']
-        valid_lons = [x for x in lons if lon_min <= x <= lon_max]
-        
-        if not valid_lons:
-            self.logger.warning(f"Ninguna longitud dentro del rango válido: {lons}")
+        if valid_lons is None:
             return None
         
-        threshold = self.config['coordinate_threshold']
-        if max(valid_lons) - min(valid_lons) < threshold:
-            return round(np.median(valid_lons), 6)
-        
         return round(np.median(valid_lons), 6)
     
     def select_best_name(self, name_list, station_id=None):
@@ -195,7 +434,7 @@ class RFDataCorrectionEngine:
         if not name_list:
             return None
         
-        valid_names = [str(n).strip() for n in name_list if n and str(n).strip()]
+        valid_names = self._valid_names(name_list)
         
         if not valid_names:
             return None
@@ -211,8 +450,23 @@ class RFDataCorrectionEngine:
                 return template_name
         
         # Algoritmo por defecto: seleccionar el más largo (generalmente más completo)
-        return max(valid_names, key=len)
+        if len(valid_names) == 1:
+            return valid_names[0]
+        lengths = np.fromiter((len(n) for n in valid_names), dtype=np.int32, count=len(valid_names))
+        return valid_names[int(lengths.argmax())]
     
+    def _valid_names(self, name_list):
+        """
+        Nombres no vacíos de una lista, sin espacios en los extremos
+
+        Args:
+            name_list: Lista de nombres
+
+        Returns:
+            Lista de nombres válidos
+        """
+        return [str(n).strip() for n in name_list if n and str(n).strip()]
+
     def select_best_structure_height(self, height_list):
         """
         Selecciona la mejor altura de estructura
@@ -226,22 +480,13 @@ class RFDataCorrectionEngine:
         if not height_list:
             return None
         
-        try:
-            heights = [float(x) for x in height_list if x]
-        except ValueError:
-            self.logger.warning(f"Valores de altura inválidos: {height_list}")
-            return None
-        
-        height_min = self.config['structure_validation']['height_min']
-        height_max = self.config['structure_validation']['height_max']
-        valid_heights = [h for h in heights if height_min <= h <= height_max]
+        valid_heights = self._bounded_floats(height_list, *self._height_range, 'altura')
         
-        if not valid_heights:
-            self.logger.warning(f"Ninguna altura dentro del rango válido: {heights}")
+        if valid_heights is None:
             return None
         
         # Retornar altura máxima (altura de la estructura, no de antenas)
-        return max(valid_heights)
+        return float(valid_heights.max())
     
     def select_best_structure_owner(self, owner_list):
         """
@@ -256,14 +501,15 @@ class RFDataCorrectionEngine:
         if not owner_list:
             return None
         
-        normalized = [self.normalize_owner(o) for o in owner_list if o]
+        # Misma normalización que normalize_owner
+        normalized = [str(o).upper().strip() for o in owner_list if o]
         
         if not normalized:
             return None
         
-        # Retornar el más frecuente
-        counter = Counter(normalized)
-        return counter.most_common(1)[0][0]
+        # Retornar el más frecuente (en empate, el primero en aparecer).
+        # Las listas son cortas: list.count es más barato que un Counter o np.unique.
+        return max(dict.fromkeys(normalized), key=normalized.count)
     
     def select_best_structure_type(self, type_list):
         """
@@ -278,15 +524,20 @@ class RFDataCorrectionEngine:
         if not type_list:
             return None
         
-        priority = self.config['structure_type_priority']
+        get_priority = self._structure_type_priority.get
         
-        valid_types = [str(t).strip() for t in type_list if t and str(t).strip() != '-']
+        # Tipos distintos en orden de aparición (la lista suele repetir el mismo tipo)
+        valid_types = list(dict.fromkeys(
+            str(t).strip() for t in type_list if t and str(t).strip() != '-'
+        ))
         
         if not valid_types:
             return None
         
-        # Seleccionar por prioridad más alta
-        return max(valid_types, key=lambda x: priority.get(x, -1))
+        # Seleccionar por prioridad más alta (max conserva el primero en empate)
+        if len(valid_types) == 1:
+            return valid_types[0]
+        return max(valid_types, key=lambda t: get_priority(t, -1))
     
     def calculate_discrepancy_score(self, values_list):
         """
@@ -301,13 +552,78 @@ class RFDataCorrectionEngine:
         if not values_list or len(values_list) <= 1:
             return 0.0
 
-        unique_values = len(set(str(v) for v in values_list if v))
-        total_values = len([v for v in values_list if v])
+        values = [str(v) for v in values_list if v]
 
-        if total_values == 0:
+        if not values:
             return 0.0
 
-        return (unique_values - 1) / total_values
+        return (len(set(values)) - 1) / len(values)
+
+    def calculate_discrepancy_scores(self, parsed_values):
+        """
+        Versión por columna de calculate_discrepancy_score
+
+        Args:
+            parsed_values: Serie de listas (salida de parse_list_values_series)
+
+        Returns:
+            Serie con el score de discrepancia de cada fila
+        """
+        exploded = parsed_values.explode().dropna()
+        exploded = exploded[exploded.astype(str) != '']
+
+        unique_counts = exploded.astype(str).groupby(level=0).nunique()
+        total_counts = exploded.groupby(level=0).size()
+
+        scores = ((unique_counts - 1) / total_counts).reindex(parsed_values.index, fill_value=0.0)
+        scores[parsed_values.map(len).to_numpy() <= 1] = 0.0
+
+        return scores
+
+    def select_best_bounded_series(self, parsed_values, vmin, vmax, how='median'):
+        """
+        Versión por columna de select_best_latitude/longitude/structure_height
+
+        Convierte todos los valores de la columna a float64 de una vez, filtra el
+        rango [vmin, vmax] y agrega por fila. Las filas sin valores en rango quedan
+        en NaN (y toda la columna si algún valor no es numérico) para que el método
+        por estación las procese y registre sus advertencias.
+
+        Args:
+            parsed_values: Serie de listas (salida de parse_list_values_series)
+            vmin, vmax: Límites del rango válido
+            how: 'median' (redondeada a 6 decimales) o 'max'
+
+        Returns:
+            Serie float con el valor seleccionado por fila (NaN = no resuelto)
+        """
+        result = pd.Series(np.nan, index=parsed_values.index)
+
+        exploded = parsed_values.explode()
+        has_items = parsed_values.map(len).to_numpy() > 0
+        exploded = exploded[exploded.index.isin(parsed_values.index[has_items])]
+        exploded = exploded[exploded.astype(bool).to_numpy()]
+
+        if exploded.empty:
+            return result
+
+        try:
+            # np.asarray(dtype=float) convierte con float(), igual que el método por estación
+            values = np.asarray(exploded.to_numpy(), dtype=np.float64)
+        except (TypeError, ValueError):
+            return result
+
+        in_range = (values >= vmin) & (values <= vmax)
+        valid = pd.Series(values[in_range], index=exploded.index[in_range])
+        grouped = valid.groupby(level=0)
+
+        if how == 'max':
+            best = grouped.max()
+        else:
+            best = grouped.median().round(6)
+
+        result.loc[best.index] = best.to_numpy()
+        return result
 
     def detect_extended_cells(self, station_id):
         """
@@ -319,33 +635,91 @@ class RFDataCorrectionEngine:
         Returns:
             Lista de sectores que son celdas extendidas
         """
-        extended_cells = []
-
         # Buscar en la hoja LTE
-        if 'lte' in self.all_sheets or 'LTE' in self.all_sheets:
-            sheet_name = 'lte' if 'lte' in self.all_sheets else 'LTE'
-            df_lte = self.all_sheets[sheet_name]
-
-            # Buscar sectores de esta estación
-            mask = df_lte['station_id'] == station_id
-            station_sectors = df_lte[mask]
-
-            # Detectar celdas extendidas (pueden tener sufijo _1, _2, etc. o carrier adicional)
-            for idx, row in station_sectors.iterrows():
-                sector_id = row.get('sector_id', '')
-                cell_name = row.get('name', '')
-
-                # Detectar patrones de celdas extendidas
-                if '_' in str(sector_id) or 'extended' in str(cell_name).lower():
-                    extended_cells.append({
-                        'sector_id': sector_id,
-                        'name': cell_name,
-                        'row_index': idx
-                    })
+        sheet_name = self._sheet_name_by_lower.get('lte')
+        if sheet_name is None:
+            return []
 
-        return extended_cells
+        # Buscar sectores de esta estación
+        rows = self.get_station_rows(sheet_name, station_id)
+        if rows is None:
+            return []
+        station_sectors = self.all_sheets[sheet_name].iloc[rows]
+
+        empty = pd.Series('', index=station_sectors.index)
+        sector_ids = station_sectors['sector_id'] if 'sector_id' in station_sectors.columns else empty
+        cell_names = station_sectors['name'] if 'name' in station_sectors.columns else empty
+
+        # Detectar celdas extendidas (pueden tener sufijo _1, _2, etc. o carrier adicional)
+        mask = (
+            sector_ids.astype(str).str.contains('_', regex=False, na=False) |
+            cell_names.astype(str).str.contains('extended', case=False, regex=False, na=False)
+        ).to_numpy()
+
+        return [
+            {'sector_id': sector_id, 'name': cell_name, 'row_index': idx}
+            for idx, sector_id, cell_name in zip(
+                station_sectors.index[mask], sector_ids[mask], cell_names[mask]
+            )
+        ]
 
-    def search_sector_info_all_sheets(self, station_id, sector_id=None, technology=None):
+    def detect_extended_cells_batch(self, station_ids):
+        """
+        Detecta los sectores extendidos de varias estaciones en una sola pasada
+
+        Args:
+            station_ids: IDs de las estaciones a revisar
+
+        Returns:
+            Diccionario {station_id: lista de cell_id extendidos}
+        """
+        columns = ['station_id', 'latitude', 'longitude']
+        id_columns = ['station_cell_id', 'cell_id', 'sector_id']
+        
+        # Columna de ID de cada estación: la primera presente en alguna de sus hojas
+        # (la que elige detect_extended_cells_in_station sobre sus filas concatenadas)
+        station_id_cols = {}
+        for station_id in station_ids:
+            present = {col for sheet_name, _ in self.get_station_locations(station_id)
+                       for col in id_columns if col in self._sheet_col_locs[sheet_name]}
+            station_id_cols[station_id] = next((col for col in id_columns if col in present), None)
+        
+        # Filas de las estaciones en cada hoja, en orden de hojas (como get_station_locations)
+        parts = []
+        cell_id_parts = []
+        for sheet_name, df_sheet in self.all_sheets.items():
+            sheet_index = self._sheet_indexes[sheet_name]
+            rows = [sheet_index[station_id] for station_id in station_ids if station_id in sheet_index]
+            if not rows:
+                continue
+            
+            col_locs = self._sheet_col_locs[sheet_name]
+            positions = np.sort(np.concatenate(rows))
+            sheet_columns = [col for col in columns if col in col_locs]
+            part = df_sheet.iloc[positions, [col_locs[col] for col in sheet_columns]]
+            
+            # ID de cada fila desde la columna elegida para su estación (vacío si la hoja no la tiene)
+            row_id_cols = np.array([station_id_cols.get(station_id) for station_id in part['station_id'].tolist()],
+                                   dtype=object)
+            cell_ids = np.full(len(part), None, dtype=object)
+            for col in id_columns:
+                if col in col_locs:
+                    mask = row_id_cols == col
+                    if mask.any():
+                        cell_ids[mask] = df_sheet.iloc[positions[mask], col_locs[col]].to_numpy(dtype=object)
+            
+            parts.append(part)
+            cell_id_parts.append(cell_ids)
+        
+        if not parts:
+            return {}
+        
+        return self.extended_detector.detect_extended_cells_batch(
+            pd.concat(parts, ignore_index=True), cell_ids=np.concatenate(cell_id_parts)
+        )
+
+    def search_sector_info_all_sheets(self, station_id, sector_id=None, technology=None,
+                                      required_fields=None):
         """
         Busca información del sector en TODAS las hojas, priorizando coincidencia de tecnología
 
@@ -353,6 +727,7 @@ class RFDataCorrectionEngine:
             station_id: ID de la estación
             sector_id: ID del sector (opcional)
             technology: Tecnología preferida (lte, umts, gsm) para priorizar resultados
+            required_fields: Solo retornar sectores con al menos uno de estos campos (opcional)
 
         Returns:
             Diccionario con la información encontrada, priorizando tecnología coincidente
@@ -362,34 +737,38 @@ class RFDataCorrectionEngine:
             'other_tech': []       # Otras tecnologías
         }
 
-        # Buscar en todas las hojas
-        for sheet_name, df_sheet in self.all_sheets.items():
-            # Filtrar por station_id
-            mask = df_sheet['station_id'] == station_id
+        # Buscar en todas las hojas donde aparece la estación
+        for sheet_name, rows in self.get_station_locations(station_id):
+            df_sheet = self.all_sheets[sheet_name]
+            matches = df_sheet.iloc[rows]
 
             # Si tenemos sector_id, filtrar también por eso
-            if sector_id and 'sector_id' in df_sheet.columns:
-                mask = mask & (df_sheet['sector_id'] == sector_id)
+            sheet_columns = self._sheet_col_locs[sheet_name]
 
-            matches = df_sheet[mask]
+            if sector_id and 'sector_id' in sheet_columns:
+                matches = matches[matches['sector_id'] == sector_id]
+
+            # Descartar sectores sin ninguno de los campos requeridos
+            if required_fields and len(matches) > 0:
+                present_required = [f for f in required_fields if f in sheet_columns]
+                if not present_required:
+                    continue
+                matches = matches.dropna(subset=present_required, how='all')
 
             if len(matches) > 0:
                 # Determinar si coincide la tecnología
                 sheet_tech = sheet_name.lower()
-                is_matching_tech = (technology and sheet_tech == technology.lower())
+                is_matching_tech = isinstance(technology, str) and sheet_tech == technology.lower()
+
+                # Conversión columnar de una vez (columnas ausentes -> None)
+                present_columns = [col for col in SECTOR_INFO_COLUMNS if col in sheet_columns]
+                records = matches[present_columns].to_dict(orient='records')
 
-                for idx, row in matches.iterrows():
+                for idx, record in zip(matches.index, records):
                     sector_data = {
                         'sheet_name': sheet_name,
                         'technology': sheet_name,
-                        'station_id': row.get('station_id'),
-                        'sector_id': row.get('sector_id'),
-                        'name': row.get('name'),
-                        'latitude': row.get('latitude'),
-                        'longitude': row.get('longitude'),
-                        'structure_height': row.get('structure_height'),
-                        'structure_owner': row.get('structure_owner'),
-                        'structure_type': row.get('structure_type'),
+                        **{col: record.get(col) for col in SECTOR_INFO_COLUMNS},
                         'row_index': idx
                     }
 
@@ -419,11 +798,20 @@ class RFDataCorrectionEngine:
         Returns:
             Diccionario con campos completados
         """
+        fields_to_complete = ['name', 'latitude', 'longitude', 'structure_height',
+                            'structure_owner', 'structure_type']
+
+        # Sin campos en blanco no hace falta recorrer las hojas
+        missing = [field for field in fields_to_complete if _is_empty(current_data.get(field))]
+        if not missing:
+            return current_data
+
         # Buscar información en todas las hojas
         sector_info = self.search_sector_info_all_sheets(
             station_id,
             sector_id=current_data.get('sector_id'),
-            technology=technology
+            technology=technology,
+            required_fields=missing
         )
 
         if not sector_info:
@@ -431,30 +819,29 @@ class RFDataCorrectionEngine:
             return current_data
 
         completed_data = current_data.copy()
-        fields_to_complete = ['name', 'latitude', 'longitude', 'structure_height',
-                            'structure_owner', 'structure_type']
 
         # Completar campos en blanco
-        for field in fields_to_complete:
-            current_val = completed_data.get(field)
-            is_empty = pd.isna(current_val) or current_val == '' or current_val is None
-            
-            if is_empty:
-                # Buscar en los resultados (ya están priorizados)
-                for info in sector_info:
-                    if not pd.isna(info.get(field)) and info.get(field) != '':
-                        completed_data[field] = info[field]
-                        self.logger.info(f"  📋 Campo '{field}' completado desde hoja '{info['sheet_name']}': {info[field]}")
-                        break
+        for field in missing:
+            # Buscar en los resultados (ya están priorizados)
+            for info in sector_info:
+                if not _is_empty(info.get(field)):
+                    completed_data[field] = info[field]
+                    self.logger.info(f"  📋 Campo '{field}' completado desde hoja '{info['sheet_name']}': {info[field]}")
+                    break
 
         return completed_data
     
-    def process_anomalous_station(self, station_data):
+    def process_anomalous_station(self, station_data, parsed_values=None, discrepancy_scores=None,
+                                  best_values=None, extended_cells=None):
         """
         Procesa una estación anómala y determina valores correctos
 
         Args:
-            station_data: Serie de pandas con datos de la estación anómala
+            station_data: Registro (dict o Serie) con datos de la estación anómala
+            parsed_values: Listas ya parseadas por campo (opcional)
+            discrepancy_scores: Scores de discrepancia ya calculados por campo (opcional)
+            best_values: Latitud/longitud/altura ya seleccionadas por columna (opcional)
+            extended_cells: Sectores extendidos ya detectados para la estación (opcional)
 
         Returns:
             Diccionario con valores correctos determinados
@@ -463,69 +850,75 @@ class RFDataCorrectionEngine:
         self.logger.info(f"Procesando estación: {station_id}")
         
         # Detectar sectores extendidos usando el nuevo detector
-        extended_cells = []
         if self.extended_detector:
-            # Obtener datos de la estación de todas las hojas
-            station_df_parts = []
-            for sheet_name, df_sheet in self.all_sheets.items():
-                mask = df_sheet['station_id'] == station_id
-                if mask.any():
-                    station_df_parts.append(df_sheet[mask])
+            if extended_cells is None:
+                # Obtener datos de la estación de todas las hojas
+                station_df_parts = [
+                    self.all_sheets[sheet_name].iloc[rows]
+                    for sheet_name, rows in self.get_station_locations(station_id)
+                ]
+                extended_cells = []
+                if station_df_parts:
+                    station_df = pd.concat(station_df_parts, ignore_index=True)
+                    extended_cells = self.extended_detector.detect_extended_cells_in_station(station_df)
             
-            if station_df_parts:
-                station_df = pd.concat(station_df_parts, ignore_index=True)
-                extended_cells = self.extended_detector.detect_extended_cells_in_station(station_df)
+            if extended_cells:
+                self.logger.info(f"  🔄 {len(extended_cells)} sectores extendidos detectados")
                 
-                if extended_cells:
-                    self.logger.info(f"  🔄 {len(extended_cells)} sectores extendidos detectados")
-                    
-                    # Marcar en todas las hojas
-                    for sheet_name, df_sheet in self.all_sheets.items():
-                        self.all_sheets[sheet_name] = self.extended_detector.mark_extended_cells(
-                            df_sheet,
-                            extended_cells
-                        )
-                    
-                    # Registrar para el reporte
-                    for cell_id in extended_cells:
-                        self.extended_cells_detected.append({
-                            'station_id': station_id,
-                            'cell_id': cell_id,
-                            'action': 'marked_as_extended_cell'
-                        })
+                # Marcar en todas las hojas
+                self.mark_extended_cells_all_sheets(station_id, extended_cells)
+                
+                # Registrar para el reporte
+                for cell_id in extended_cells:
+                    self.extended_cells_detected.append({
+                        'station_id': station_id,
+                        'cell_id': cell_id,
+                        'action': 'marked_as_extended_cell'
+                    })
         else:
             # Fallback al método legacy
+            extended_cells = []
             extended_cells_legacy = self.detect_extended_cells(station_id)
             if extended_cells_legacy:
                 self.logger.info(f"  🔄 Detectadas {len(extended_cells_legacy)} celdas extendidas (método legacy)")
 
-        # Parsear listas
-        names = self.parse_list_values(station_data['name'])
-        lats = self.parse_list_values(station_data['latitude'])
-        lons = self.parse_list_values(station_data['longitude'])
-        heights = self.parse_list_values(station_data['structure_height'])
-        owners = self.parse_list_values(station_data['structure_owner'])
-        types = self.parse_list_values(station_data['structure_type'])
-
-        # Calcular scores de discrepancia
-        discrepancy_scores = {
-            'latitude': self.calculate_discrepancy_score(lats),
-            'longitude': self.calculate_discrepancy_score(lons),
-            'name': self.calculate_discrepancy_score(names),
-            'structure_height': self.calculate_discrepancy_score(heights),
-            'structure_owner': self.calculate_discrepancy_score(owners),
-            'structure_type': self.calculate_discrepancy_score(types)
-        }
+        # Parsear listas (si no vienen precalculadas desde process_anomalous_file)
+        if parsed_values is None:
+            parsed_values = {field: self.parse_list_values(station_data[field]) for field in LIST_FIELDS}
+
+        names = parsed_values['name']
+        lats = parsed_values['latitude']
+        lons = parsed_values['longitude']
+        heights = parsed_values['structure_height']
+        owners = parsed_values['structure_owner']
+        types = parsed_values['structure_type']
+
+        # Calcular scores de discrepancia (listas de 0-1 elementos: sin discrepancia)
+        if discrepancy_scores is None and all(len(parsed_values[field]) <= 1 for field in LIST_FIELDS):
+            discrepancy_scores = dict.fromkeys(LIST_FIELDS, 0.0)
+        elif discrepancy_scores is None:
+            discrepancy_scores = {
+                field: self.calculate_discrepancy_score(parsed_values[field]) for field in LIST_FIELDS
+            }
 
         avg_discrepancy = np.mean(list(discrepancy_scores.values()))
 
+        # Valores numéricos ya resueltos por columna (si no, se calculan aquí)
+        best_values = best_values or {}
+        best_lat = best_values.get('latitude')
+        best_lon = best_values.get('longitude')
+        best_height = best_values.get('structure_height')
+
         # Determinar valores correctos
         correct_values = {
             'station_id': station_id,
             'name': self.select_best_name(names, station_id),
-            'latitude': self.select_best_latitude(lats) if not extended_cells else None,
-            'longitude': self.select_best_longitude(lons) if not extended_cells else None,
-            'structure_height': self.select_best_structure_height(heights),
+            'latitude': (None if extended_cells
+                         else best_lat if best_lat is not None else self.select_best_latitude(lats)),
+            'longitude': (None if extended_cells
+                          else best_lon if best_lon is not None else self.select_best_longitude(lons)),
+            'structure_height': (best_height if best_height is not None
+                                 else self.select_best_structure_height(heights)),
             'structure_owner': self.select_best_structure_owner(owners),
             'structure_type': self.select_best_structure_type(types),
             'discrepancy_score': avg_discrepancy,
@@ -547,7 +940,7 @@ class RFDataCorrectionEngine:
             )
 
         # Marcar para revisión manual si discrepancia es alta
-        threshold = self.config['processing']['require_manual_review_threshold']
+        threshold = self._manual_review_threshold
         if avg_discrepancy > threshold and not extended_cells:
             self.logger.warning(f"Estación {station_id} requiere revisión manual (score: {avg_discrepancy:.2f})")
             self.manual_review_required.append({
@@ -568,6 +961,19 @@ class RFDataCorrectionEngine:
 
         return correct_values
     
+    def mark_extended_cells_all_sheets(self, station_id, extended_cells):
+        """
+        Marca los sectores extendidos de una estación en todas las hojas (en el lugar)
+
+        Args:
+            station_id: ID de la estación
+            extended_cells: Lista de cell_id que son extended cells
+        """
+        for sheet_name, rows in self.get_station_locations(station_id):
+            self.extended_detector.mark_extended_cells(
+                self.all_sheets[sheet_name], extended_cells, rows=rows
+            )
+
     def apply_corrections(self, station_id, correct_values):
         """
         Aplica correcciones al DataFrame de parámetros físicos y a todas las hojas
@@ -581,19 +987,18 @@ class RFDataCorrectionEngine:
         """
         corrections_made = []
         total_rows_affected = 0
+        timestamp = self._run_timestamp or datetime.now().isoformat()
         
         # No corregir coordenadas si hay extended cells
         skip_coords = correct_values.get('has_extended_cells', False)
 
-        # Aplicar correcciones en TODAS las hojas
-        for sheet_name, df_sheet in self.all_sheets.items():
-            mask = df_sheet['station_id'] == station_id
-            affected_rows = df_sheet[mask].index
-
-            if len(affected_rows) == 0:
-                continue
-
+        # Aplicar correcciones en TODAS las hojas donde aparece la estación
+        for sheet_name, affected_rows in self.get_station_locations(station_id):
+            df_sheet = self.all_sheets[sheet_name]
             self.logger.info(f"Aplicando correcciones en hoja '{sheet_name}': {len(affected_rows)} filas")
+            col_locs = self._sheet_col_locs[sheet_name]
+            write_cols = []
+            write_values = []
 
             for param, new_value in correct_values.items():
                 if param in ['station_id', 'discrepancy_score', 'sector_id', 'has_extended_cells']:
@@ -608,43 +1013,52 @@ class RFDataCorrectionEngine:
                     continue
 
                 # Verificar que la columna existe en esta hoja
-                if param not in df_sheet.columns:
+                col = col_locs.get(param)
+                if col is None:
                     continue
 
-                # Obtener valores actuales únicos
-                old_values = df_sheet.loc[mask, param].unique().tolist()
+                current_values = df_sheet.iloc[affected_rows, col]
 
-                # Aplicar corrección solo si hay cambio
-                if len(old_values) > 1 or (len(old_values) > 0 and old_values[0] != new_value):
-                    df_sheet.loc[mask, param] = new_value
-
-                    correction_record = {
-                        'station_id': station_id,
-                        'sheet_name': sheet_name,
-                        'parameter': param,
-                        'old_values': str(old_values),
-                        'new_value': new_value,
-                        'rows_affected': len(affected_rows),
-                        'timestamp': datetime.now().isoformat(),
-                        'source': 'template' if self.template_manager and param in ['structure_owner', 'structure_type', 'tx_type', 'name'] else 'algorithm'
-                    }
+                # Saltar sin construir listas si todas las filas ya tienen el nuevo valor
+                if _all_equal(current_values, new_value):
+                    continue
 
-                    corrections_made.append(correction_record)
-                    self.logger.info(f"  ✓ [{sheet_name}] {param}: {old_values} → {new_value}")
+                # Registrar corrección (hay cambio); se escribe junto con el resto de la hoja
+                old_values = current_values.unique().tolist()
+                write_cols.append(col)
+                write_values.append(new_value)
+
+                correction_record = {
+                    'station_id': station_id,
+                    'sheet_name': sheet_name,
+                    'parameter': param,
+                    'old_values': str(old_values),
+                    'new_value': new_value,
+                    'rows_affected': len(affected_rows),
+                    'timestamp': timestamp,
+                    'source': 'template' if self.template_manager and param in ['structure_owner', 'structure_type', 'tx_type', 'name'] else 'algorithm'
+                }
+
+                corrections_made.append(correction_record)
+                self.logger.info(f"  ✓ [{sheet_name}] {param}: {old_values} → {new_value}")
+
+            # Diferir (una escritura por columna al final) o escribir de una vez en la hoja
+            if self._pending_writes is not None:
+                sheet_records = corrections_made[-len(write_cols):] if write_cols else []
+                for col, new_value, record in zip(write_cols, write_values, sheet_records):
+                    rows_list, values_list, records = self._pending_writes.setdefault(
+                        (sheet_name, col), ([], [], [])
+                    )
+                    rows_list.append(affected_rows)
+                    values_list.append(new_value)
+                    records.append(record)
+            elif write_cols:
+                for col, new_value in zip(write_cols, write_values):
+                    self._add_categories(df_sheet, col, [new_value])
+                df_sheet.iloc[affected_rows, write_cols] = write_values
 
             total_rows_affected += len(affected_rows)
 
-        # Actualizar también el DataFrame consolidado
-        mask_consolidated = self.df_physical['station_id'] == station_id
-        if mask_consolidated.any():
-            for param, new_value in correct_values.items():
-                if param in ['station_id', 'discrepancy_score', 'has_extended_cells']:
-                    continue
-                if skip_coords and param in ['latitude', 'longitude']:
-                    continue
-                if param in self.df_physical.columns:
-                    self.df_physical.loc[mask_consolidated, param] = new_value
-
         if total_rows_affected == 0:
             self.logger.warning(f"Estación {station_id} no encontrada en ninguna hoja")
 
@@ -662,33 +1076,221 @@ class RFDataCorrectionEngine:
             Lista de todas las correcciones realizadas
         """
         self.logger.info(f"Cargando archivo de anomalías: {anomalous_file}")
-        df_anomalous = pd.read_excel(anomalous_file, sheet_name=sheet_name)
+        df_anomalous = pd.read_excel(anomalous_file, sheet_name=sheet_name, engine=EXCEL_READ_ENGINE)
         
         self.logger.info(f"Procesando {len(df_anomalous)} estaciones anómalas...")
         
-        all_corrections = []
+        self._correction_rows = []
+        self._run_timestamp = datetime.now().isoformat()
         
-        for idx, row in df_anomalous.iterrows():
-            station_id = row['station_id']
+        # Parsear listas y calcular discrepancias de todas las estaciones de una vez
+        parsed_columns = {}
+        score_columns = {}
+        best_columns = {}
+        if all(field in df_anomalous.columns for field in LIST_FIELDS):
+            for field in LIST_FIELDS:
+                parsed_columns[field] = self.parse_list_values_series(df_anomalous[field])
+                score_columns[field] = self.calculate_discrepancy_scores(parsed_columns[field])
             
-            try:
-                # Determinar valores correctos
-                correct_values = self.process_anomalous_station(row)
-                
-                # Aplicar correcciones
-                corrections = self.apply_corrections(station_id, correct_values)
-                all_corrections.extend(corrections)
+            # Filtro de rango y selección numérica de todas las estaciones de una vez
+            best_columns = {
+                'latitude': self.select_best_bounded_series(parsed_columns['latitude'], *self._lat_range),
+                'longitude': self.select_best_bounded_series(parsed_columns['longitude'], *self._lon_range),
+                'structure_height': self.select_best_bounded_series(
+                    parsed_columns['structure_height'], *self._height_range, how='max'
+                )
+            }
+            
+            # Nombres de referencia del template de todas las estaciones de una vez
+            # (quedan en la caché que consulta select_best_name)
+            if self.template_manager:
+                name_stations = []
+                name_candidates = []
+                for station_id, names in zip(df_anomalous['station_id'], parsed_columns['name']):
+                    valid_names = self._valid_names(names) if station_id and names else []
+                    if valid_names:
+                        name_stations.append(station_id)
+                        name_candidates.append(valid_names)
+                self.template_manager.batch_get_reference_names(name_stations, name_candidates)
+        
+        # Registros como dicts (sin construir una Serie por fila)
+        # Sin estaciones repetidas, las escrituras se acumulan y se aplican al final
+        # (una por columna) y los sectores extendidos se detectan de una vez;
+        # con repetidas, cada estación debe ver las anteriores
+        extended_by_station = None
+        if not df_anomalous['station_id'].duplicated().any():
+            self._pending_writes = {}
+            if self.extended_detector:
+                extended_by_station = self.detect_extended_cells_batch(df_anomalous['station_id'])
+        
+        tasks = []
+        for idx, row in zip(df_anomalous.index, df_anomalous.to_dict('records')):
+            extended_cells = None
+            if extended_by_station is not None:
+                extended_cells = extended_by_station.get(row['station_id'], [])
+            parsed_values = None
+            discrepancy_scores = None
+            best_values = None
+            if parsed_columns:
+                parsed_values = {field: parsed_columns[field][idx] for field in LIST_FIELDS}
+                discrepancy_scores = {field: float(score_columns[field][idx]) for field in LIST_FIELDS}
+                best_values = {}
+                for field, column in best_columns.items():
+                    value = column[idx]
+                    if not np.isnan(value):
+                        # Mismo tipo que el método por estación (np.float64 en coordenadas)
+                        best_values[field] = float(value) if field == 'structure_height' else value
+            tasks.append((row, parsed_values, discrepancy_scores, best_values, extended_cells))
+        
+        max_workers = self.config['processing'].get('max_workers', 1) or os.cpu_count() or 1
+        
+        if max_workers > 1 and len(tasks) > 1:
+            self._process_stations_parallel(tasks, max_workers)
+        else:
+            for row, parsed_values, discrepancy_scores, best_values, extended_cells in tasks:
+                station_id = row['station_id']
                 
-            except Exception as e:
-                self.logger.error(f"Error procesando {station_id}: {str(e)}")
-                import traceback
-                self.logger.error(traceback.format_exc())
-                continue
+                try:
+                    # Determinar valores correctos
+                    correct_values = self.process_anomalous_station(
+                        row, parsed_values, discrepancy_scores, best_values, extended_cells
+                    )
+                    
+                    # Aplicar correcciones
+                    corrections = self.apply_corrections(station_id, correct_values)
+                    self._correction_rows.extend(corrections)
+                    
+                except Exception as e:
+                    self.logger.error(f"Error procesando {station_id}: {str(e)}")
+                    self.logger.error(traceback.format_exc())
+                    continue
+        
+        self.flush_pending_writes()
+        self._run_timestamp = None
+        
+        # Log de correcciones construido una sola vez, por columnas
+        if self._correction_rows:
+            self.corrections_log = pd.DataFrame({
+                col: [record[col] for record in self._correction_rows]
+                for col in CORRECTION_LOG_COLUMNS
+            })
+        else:
+            self.corrections_log = pd.DataFrame()
+        self.logger.info(f"Proceso completado: {len(self._correction_rows)} correcciones realizadas")
+        
+        return self._correction_rows
+    
+    def _add_categories(self, df_sheet, col, new_values):
+        """
+        Agrega a una columna categórica los valores que aún no son categorías
+
+        Args:
+            df_sheet: DataFrame de la hoja
+            col: Posición de la columna
+            new_values: Valores que se van a escribir
+        """
+        column = df_sheet.iloc[:, col]
+        if not isinstance(column.dtype, pd.CategoricalDtype):
+            return
         
-        self.corrections_log = all_corrections
-        self.logger.info(f"Proceso completado: {len(all_corrections)} correcciones realizadas")
+        categories = column.cat.categories
+        missing = [v for v in dict.fromkeys(new_values) if not _is_empty(v) and v not in categories]
+        if not missing:
+            return
+        
+        try:
+            df_sheet.isetitem(col, column.cat.add_categories(missing))
+        except (TypeError, ValueError):
+            # Tipo de valor incompatible con las categorías: volver a object
+            df_sheet.isetitem(col, column.astype(object))
+    
+    def flush_pending_writes(self):
+        """
+        Aplica las escrituras diferidas por apply_corrections: una por (hoja, columna)
+
+        Si una columna no admite alguno de los valores, se escribe estación por
+        estación y las correcciones que fallan se quitan del log.
+        """
+        pending = self._pending_writes
+        self._pending_writes = None
+        
+        if not pending:
+            return
+        
+        for (sheet_name, col), (rows_list, values_list, records) in pending.items():
+            df_sheet = self.all_sheets[sheet_name]
+            rows = np.concatenate(rows_list)
+            values = np.empty(len(rows), dtype=object)
+            start = 0
+            for station_rows, new_value in zip(rows_list, values_list):
+                values[start:start + len(station_rows)] = new_value
+                start += len(station_rows)
+            
+            self._add_categories(df_sheet, col, values_list)
+            
+            try:
+                df_sheet.iloc[rows, col] = pd.Series(values, dtype=object).infer_objects().to_numpy()
+                continue
+            except (TypeError, ValueError):
+                pass
+            
+            # Valor incompatible con el tipo de la columna: escribir por estación
+            for station_rows, new_value, record in zip(rows_list, values_list, records):
+                try:
+                    df_sheet.iloc[station_rows, col] = new_value
+                except (TypeError, ValueError) as e:
+                    self.logger.error(
+                        f"Error corrigiendo {record['station_id']} [{sheet_name}] "
+                        f"{record['parameter']}: {e}"
+                    )
+                    self._correction_rows = [r for r in self._correction_rows if r is not record]
+    
+    def _process_stations_parallel(self, tasks, max_workers):
+        """
+        Determina los valores correctos en paralelo y aplica las correcciones en serie
+
+        Cada worker recibe una copia del motor al iniciarse, por lo que las
+        decisiones se toman sobre los datos originales (sin ver correcciones
+        de otras estaciones). Las escrituras se hacen solo en este proceso.
+
+        Args:
+            tasks: Lista de tuplas (row, parsed_values, discrepancy_scores, best_values,
+                extended_cells)
+            max_workers: Número de procesos
+        """
+        workers = min(max_workers, len(tasks))
+        chunksize = max(1, len(tasks) // (4 * workers))
+        self.logger.info(f"Evaluando estaciones con {workers} procesos...")
         
-        return all_corrections
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_station_worker,
+                                 initargs=(self,)) as executor:
+            results = executor.map(_evaluate_station_worker, tasks, chunksize=chunksize)
+            
+            for (row, *_), (correct_values, manual_review, extended, error) in zip(tasks, results):
+                station_id = row['station_id']
+                
+                if error is not None:
+                    self.logger.error(f"Error procesando {station_id}")
+                    self.logger.error(error)
+                    continue
+                
+                self.manual_review_required.extend(manual_review)
+                self.extended_cells_detected.extend(extended)
+                
+                try:
+                    if extended:
+                        self.mark_extended_cells_all_sheets(
+                            station_id, [cell['cell_id'] for cell in extended]
+                        )
+                    
+                    corrections = self.apply_corrections(station_id, correct_values)
+                    self._correction_rows.extend(corrections)
+                    
+                except Exception as e:
+                    self.logger.error(f"Error procesando {station_id}: {str(e)}")
+                    self.logger.error(traceback.format_exc())
+                    continue
     
     def save_corrected_data(self, output_file):
         """
@@ -699,21 +1301,95 @@ class RFDataCorrectionEngine:
         """
         # Actualizar campos de modificación en todas las hojas
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        metadata = {
+            'db_modified_by_user': self.config['system_user'],
+            'db_modification_datetime': timestamp
+        }
 
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        # xlsxwriter en modo constant_memory: cada fila se escribe completa y en orden.
+        # Sin xlsxwriter, openpyxl en modo write_only (también en streaming).
+        if XLSXWRITER_AVAILABLE:
+            workbook = xlsxwriter.Workbook(output_file, {
+                'constant_memory': True,
+                **XLSXWRITER_STRING_OPTIONS,
+                'default_date_format': 'yyyy-mm-dd hh:mm:ss'
+            })
+        else:
+            workbook = Workbook(write_only=True)
+
+        try:
             for sheet_name, df_sheet in self.all_sheets.items():
-                # Actualizar metadatos si las columnas existen
-                if 'db_modified_by_user' in df_sheet.columns:
-                    df_sheet['db_modified_by_user'] = self.config['system_user']
-                if 'db_modification_datetime' in df_sheet.columns:
-                    df_sheet['db_modification_datetime'] = timestamp
-
-                # Guardar hoja
-                df_sheet.to_excel(writer, sheet_name=sheet_name, index=False)
+                # Actualizar metadatos si las columnas existen (una sola asignación)
+                metadata_columns = [col for col in metadata if col in self._sheet_col_locs[sheet_name]]
+                if metadata_columns:
+                    df_sheet[metadata_columns] = [metadata[col] for col in metadata_columns]
+
+                # Guardar hoja: una sola copia a object (NaN/NaT -> celda vacía)
+                values = df_sheet.to_numpy(dtype=object)
+                values[pd.isna(values)] = None
+                if XLSXWRITER_AVAILABLE:
+                    worksheet = workbook.add_worksheet(sheet_name)
+                    worksheet.write_row(0, 0, list(df_sheet.columns))
+                    for row_num, row in enumerate(values.tolist(), start=1):
+                        worksheet.write_row(row_num, 0, row)
+                else:
+                    worksheet = workbook.create_sheet(sheet_name)
+                    worksheet.append(list(df_sheet.columns))
+                    for row in values.tolist():
+                        worksheet.append(row)
+
                 self.logger.info(f"✓ Hoja '{sheet_name}' guardada: {len(df_sheet)} filas")
 
+            if not XLSXWRITER_AVAILABLE:
+                workbook.save(output_file)
+        finally:
+            workbook.close()
+
         self.logger.info(f"✓ Archivo corregido guardado con {len(self.all_sheets)} hojas: {output_file}")
+        
+        # Caché de las hojas (opcional) para que BlankFieldFiller no re-parsee el Excel
+        cache_dir = get_cache_dir(self.config)
+        if cache_dir:
+            try:
+                save_sheets_cache(self.all_sheets, output_file, cache_dir)
+            except Exception as e:
+                self.logger.warning(f"No se pudo guardar caché de hojas: {e}")
     
+    def _parameter_statistics(self, df_corrections):
+        """
+        Estadísticas por parámetro: estaciones distintas y filas afectadas
+
+        Equivale a groupby('parameter').agg({'station_id': 'nunique',
+        'rows_affected': 'sum'}) pero con factorize/reduceat sobre los arrays.
+
+        Args:
+            df_corrections: Log de correcciones
+
+        Returns:
+            Tupla (DataFrame indexado por parámetro (ordenado), total de estaciones distintas)
+        """
+        param_codes, param_names = pd.factorize(df_corrections['parameter'], sort=True)
+        station_codes, station_uniques = pd.factorize(df_corrections['station_id'])
+        n_params = len(param_names)
+
+        # Suma de filas por parámetro: ordenar por código y reducir por tramos
+        order = np.argsort(param_codes, kind='stable')
+        sorted_codes = param_codes[order]
+        starts = np.searchsorted(sorted_codes, np.arange(n_params))
+        rows_affected = df_corrections['rows_affected'].to_numpy()[order]
+        rows_sum = np.add.reduceat(rows_affected, starts)
+
+        # Estaciones distintas por parámetro: pares (parámetro, estación) únicos
+        valid = station_codes >= 0
+        pairs = np.unique(param_codes[valid].astype(np.int64) * len(station_uniques) + station_codes[valid])
+        stations_affected = np.bincount(pairs // max(len(station_uniques), 1), minlength=n_params)
+
+        param_stats = pd.DataFrame(
+            {'stations_affected': stations_affected, 'rows_affected': rows_sum},
+            index=pd.Index(param_names, name='parameter')
+        )
+        return param_stats, len(station_uniques)
+
     def generate_correction_report(self, report_file):
         """
         Genera reporte detallado de correcciones en Excel
@@ -721,18 +1397,22 @@ class RFDataCorrectionEngine:
         Args:
             report_file: Ruta donde guardar el reporte
         """
-        df_corrections = pd.DataFrame(self.corrections_log)
+        df_corrections = self.corrections_log
+        execution_time = datetime.now().isoformat()
         
-        # Crear resumen estadístico
+        # Crear resumen estadístico (a partir de las estadísticas por parámetro)
+        param_stats = None
         if len(df_corrections) > 0:
+            param_stats, total_stations = self._parameter_statistics(df_corrections)
+            source_counts = df_corrections.get('source', pd.Series(['algorithm'])).value_counts()
             summary = {
-                'total_stations': df_corrections['station_id'].nunique(),
+                'total_stations': total_stations,
                 'total_corrections': len(df_corrections),
-                'total_rows_affected': df_corrections['rows_affected'].sum(),
-                'corrections_from_template': (df_corrections.get('source', pd.Series(['algorithm'])) == 'template').sum(),
-                'corrections_from_algorithm': (df_corrections.get('source', pd.Series(['algorithm'])) == 'algorithm').sum(),
+                'total_rows_affected': param_stats['rows_affected'].sum(),
+                'corrections_from_template': source_counts.get('template', 0),
+                'corrections_from_algorithm': source_counts.get('algorithm', 0),
                 'extended_cells_detected': len(self.extended_cells_detected),
-                'execution_time': datetime.now().isoformat()
+                'execution_time': execution_time
             }
         else:
             summary = {
@@ -742,7 +1422,7 @@ class RFDataCorrectionEngine:
                 'corrections_from_template': 0,
                 'corrections_from_algorithm': 0,
                 'extended_cells_detected': len(self.extended_cells_detected),
-                'execution_time': datetime.now().isoformat()
+                'execution_time': execution_time
             }
         
         # Crear DataFrames adicionales
@@ -750,7 +1430,11 @@ class RFDataCorrectionEngine:
         df_extended_cells = pd.DataFrame(self.extended_cells_detected) if self.extended_cells_detected else pd.DataFrame()
         
         # Guardar en Excel con múltiples hojas
-        with pd.ExcelWriter(report_file, engine='xlsxwriter') as writer:
+        writer_kwargs = {}
+        if EXCEL_WRITE_ENGINE == 'xlsxwriter':
+            writer_kwargs['engine_kwargs'] = {'options': XLSXWRITER_STRING_OPTIONS}
+        
+        with pd.ExcelWriter(report_file, engine=EXCEL_WRITE_ENGINE, **writer_kwargs) as writer:
             # Hoja 1: Resumen
             pd.DataFrame([summary]).to_excel(writer, sheet_name='summary', index=False)
             
@@ -763,11 +1447,7 @@ class RFDataCorrectionEngine:
                 df_manual_review.to_excel(writer, sheet_name='manual_review_required', index=False)
             
             # Hoja 4: Estadísticas por parámetro
-            if len(df_corrections) > 0:
-                param_stats = df_corrections.groupby('parameter').agg({
-                    'station_id': 'nunique',
-                    'rows_affected': 'sum'
-                }).rename(columns={'station_id': 'stations_affected'})
+            if param_stats is not None:
                 param_stats.to_excel(writer, sheet_name='parameter_statistics')
             
             # Hoja 5: Extended Cells
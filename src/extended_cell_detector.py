@@ -2,7 +2,75 @@ import pandas as pd
 import numpy as np
 import re
 import logging
-from typing import List, Tuple, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple, Optional
+
+# Valor de cell_type para los sectores extendidos
+EXTENDED_CELL_TYPE = 'Extended Cell'
+
+# Aproximación usada para convertir el umbral en grados a km (1° ≈ 111km)
+KM_PER_DEGREE = 111
+
+# Radio medio de la Tierra (km)
+EARTH_RADIUS_KM = 6371.0088
+
+def _haversine_km(lats: np.ndarray, lons: np.ndarray, lat0: float, lon0: float) -> np.ndarray:
+    """Distancia de gran círculo (km) de cada coordenada a (lat0, lon0)"""
+    lats, lons = np.radians(lats), np.radians(lons)
+    lat0, lon0 = np.radians(lat0), np.radians(lon0)
+    a = np.sin((lats - lat0) / 2)**2 + np.cos(lats) * np.cos(lat0) * np.sin((lons - lon0) / 2)**2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+@lru_cache(maxsize=4096)
+def _compile_pattern(station_id: str) -> re.Pattern:
+    """Patrón compilado [station_id]R[n] de una estación (uno por estación y proceso)"""
+    return re.compile(f"^{re.escape(station_id)}R\\d+$", re.IGNORECASE)
+
+def _main_locations(codes: np.ndarray, lats: np.ndarray, lons: np.ndarray,
+                    n_stations: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Ubicación principal y número de ubicaciones de cada estación
+    
+    La ubicación principal es la que más sectores tiene; en empate, la primera
+    en orden (latitud, longitud), como groupby(...).size().idxmax().
+    
+    Args:
+        codes: Código de estación por fila (-1 = sin estación)
+        lats, lons: Coordenadas por fila
+        n_stations: Número de estaciones (códigos 0..n_stations-1)
+        
+    Returns:
+        Tupla (main_lats, main_lons, n_locations) indexada por código
+    """
+    main_lats = np.full(n_stations, np.nan)
+    main_lons = np.full(n_stations, np.nan)
+    
+    # Ubicaciones únicas por estación: filas ordenadas por (estación, latitud, longitud)
+    order = np.lexsort((lons, lats, codes))
+    order = order[codes[order] >= 0]
+    if len(order) == 0:
+        return main_lats, main_lons, np.zeros(n_stations, dtype=np.intp)
+    sorted_codes, sorted_lats, sorted_lons = codes[order], lats[order], lons[order]
+    
+    new_location = np.ones(len(order), dtype=bool)
+    new_location[1:] = ((sorted_codes[1:] != sorted_codes[:-1]) |
+                        (sorted_lats[1:] != sorted_lats[:-1]) |
+                        (sorted_lons[1:] != sorted_lons[:-1]))
+    location_starts = np.flatnonzero(new_location)
+    location_counts = np.diff(np.append(location_starts, len(order)))
+    location_codes = sorted_codes[location_starts]
+    
+    # Por estación, la ubicación con más sectores (en empate, la primera)
+    best = np.lexsort((np.arange(len(location_starts)), -location_counts, location_codes))
+    first_of_station = np.ones(len(best), dtype=bool)
+    first_of_station[1:] = location_codes[best[1:]] != location_codes[best[:-1]]
+    main = best[first_of_station]
+    
+    main_lats[location_codes[main]] = sorted_lats[location_starts[main]]
+    main_lons[location_codes[main]] = sorted_lons[location_starts[main]]
+    n_locations = np.bincount(location_codes, minlength=n_stations)
+    
+    return main_lats, main_lons, n_locations
 
 class ExtendedCellDetector:
     """
@@ -20,6 +88,10 @@ class ExtendedCellDetector:
         self.config = config
         self.logger = logging.getLogger(__name__)
         self.distance_threshold = config['extended_cell_distance_threshold']
+        self._threshold_sq = self.distance_threshold ** 2
+        # 'euclidean' (grados) o 'haversine' (km, correcta a cualquier latitud)
+        self.distance_method = config.get('extended_cell_distance_method', 'euclidean')
+        self._threshold_km = self.distance_threshold * KM_PER_DEGREE
     
     def calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> Optional[float]:
         """
@@ -35,8 +107,10 @@ class ExtendedCellDetector:
         Returns:
             Distancia en grados decimales o None si hay valores inválidos
         """
-        if any(pd.isna([lat1, lon1, lat2, lon2])):
-            return None
+        # NaN es el único valor distinto de sí mismo; None y pd.NA se descartan antes
+        for value in (lat1, lon1, lat2, lon2):
+            if value is None or value is pd.NA or value != value:
+                return None
         
         try:
             # Aproximación euclidiana simple
@@ -64,12 +138,9 @@ class ExtendedCellDetector:
         if not station_id or not cell_id:
             return False
         
-        # Patrón: station_id + 'R' + dígitos
-        # Usar re.escape para caracteres especiales en station_id
-        pattern = f"^{re.escape(str(station_id))}R\\d+$"
-        
+        # Patrón: station_id + 'R' + dígitos (compilado una vez por estación)
         try:
-            match = re.match(pattern, str(cell_id), re.IGNORECASE)
+            match = _compile_pattern(str(station_id)).match(str(cell_id))
             return match is not None
         except Exception as e:
             self.logger.warning(f"Error verificando nomenclatura para {cell_id}: {e}")
@@ -104,84 +175,221 @@ class ExtendedCellDetector:
             return extended_cells
         
         # Determinar la columna de identificación de celda
-        cell_id_col = None
-        for possible_col in ['station_cell_id', 'cell_id', 'sector_id']:
-            if possible_col in station_data.columns:
-                cell_id_col = possible_col
-                break
+        cell_id_col = self._find_cell_id_col(station_data.columns)
         
         if not cell_id_col:
             self.logger.debug(f"No se encontró columna de cell_id para {station_id}")
             return extended_cells
         
         # Filtrar filas con coordenadas válidas
-        valid_coords = station_data.dropna(subset=['latitude', 'longitude']).copy()
+        valid_coords = station_data.dropna(subset=['latitude', 'longitude'])
         
         if len(valid_coords) <= 1:
             # Solo hay una ubicación o ninguna, no hay sectores extendidos
             return extended_cells
         
-        # Agrupar por coordenadas únicas
-        coord_groups = valid_coords.groupby(['latitude', 'longitude'])
+        # Verificar nomenclatura de todos los sectores con un único patrón por estación;
+        # sin candidatos no hace falta calcular ubicaciones ni distancias
+        if not station_id:
+            return extended_cells
+        pattern = _compile_pattern(str(station_id))
+        cell_id_values = valid_coords[cell_id_col]
+        nomenclature = cell_id_values.astype(str).str.match(pattern, na=False).to_numpy(dtype=bool)
+        
+        if not nomenclature.any():
+            return extended_cells
+        
+        lats = pd.to_numeric(valid_coords['latitude'], errors='coerce').to_numpy(dtype=np.float64)
+        lons = pd.to_numeric(valid_coords['longitude'], errors='coerce').to_numpy(dtype=np.float64)
         
-        if len(coord_groups) <= 1:
+        # Coordenadas únicas (ordenadas por latitud y longitud) y sectores en cada una
+        unique_coords, counts = np.unique(np.column_stack((lats, lons)), axis=0, return_counts=True)
+        
+        if len(unique_coords) <= 1:
             # Solo hay una ubicación, no hay sectores extendidos
             return extended_cells
         
-        # Obtener ubicación principal (la que más sectores tiene)
-        group_sizes = coord_groups.size()
-        main_location = group_sizes.idxmax()
-        main_lat, main_lon = main_location
+        # Obtener ubicación principal (la que más sectores tiene; en empate, la primera)
+        main_lat, main_lon = unique_coords[counts.argmax()]
+        
+        self.logger.debug("Ubicación principal de %s: (%s, %s)", station_id, main_lat, main_lon)
+        
+        # Distancias a la ubicación principal solo de los candidatos, en una sola pasada
+        far, distances = self._far_from_main_location(
+            lats[nomenclature], lons[nomenclature], main_lat, main_lon
+        )
+        
+        candidates = cell_id_values.to_numpy()[nomenclature]
+        for cell_id, distance in zip(candidates[far], distances[far]):
+            extended_cells.append(str(cell_id))
+            self._log_extended_cell(cell_id, distance)
+        
+        return extended_cells
+    
+    def detect_extended_cells_batch(self, df: pd.DataFrame,
+                                    cell_ids: Optional[np.ndarray] = None) -> Dict[Any, List[str]]:
+        """
+        Detecta sectores extendidos de varias estaciones en una sola pasada
         
-        self.logger.debug(f"Ubicación principal de {station_id}: ({main_lat}, {main_lon})")
+        Aplica los mismos criterios que detect_extended_cells_in_station, pero la
+        ubicación principal, las distancias y el umbral se calculan para todas
+        las estaciones a la vez (sin un DataFrame por estación).
         
-        # Revisar cada sector
-        for idx, row in valid_coords.iterrows():
-            cell_id = row.get(cell_id_col, '')
-            cell_lat = row.get('latitude')
-            cell_lon = row.get('longitude')
+        Args:
+            df: DataFrame con los sectores de todas las estaciones a revisar
+            cell_ids: cell_id de cada fila de df (opcional); necesario si las filas
+                vienen de hojas con distintas columnas de ID. Si no se da, se usa
+                la columna de _find_cell_id_col para todas las filas
             
-            # Verificar nomenclatura
-            if not self.follows_extended_nomenclature(station_id, cell_id):
+        Returns:
+            Diccionario {station_id: lista de cell_id extendidos} (solo estaciones con alguno)
+        """
+        extended_cells = {}
+        
+        if len(df) == 0 or not all(col in df.columns for col in ['station_id', 'latitude', 'longitude']):
+            return extended_cells
+        
+        if cell_ids is None:
+            cell_id_col = self._find_cell_id_col(df.columns)
+            if not cell_id_col:
+                self.logger.debug("No se encontró columna de cell_id para detectar extended cells")
+                return extended_cells
+            cell_ids = df[cell_id_col].to_numpy()
+        
+        has_coords = df[['latitude', 'longitude']].notna().all(axis=1).to_numpy()
+        valid_coords = df[has_coords]
+        cell_id_values = np.asarray(cell_ids, dtype=object)[has_coords]
+        codes, station_ids = pd.factorize(valid_coords['station_id'])
+        lats = pd.to_numeric(valid_coords['latitude'], errors='coerce').to_numpy(dtype=np.float64)
+        lons = pd.to_numeric(valid_coords['longitude'], errors='coerce').to_numpy(dtype=np.float64)
+        
+        has_station = codes >= 0
+        if not has_station.any():
+            return extended_cells
+        
+        main_lats, main_lons, n_locations = _main_locations(codes, lats, lons, len(station_ids))
+        
+        # Solo estaciones con más de una ubicación pueden tener sectores extendidos
+        multiple_locations = n_locations > 1
+        row_codes = np.where(has_station, codes, 0)
+        
+        far, distances = self._far_from_main_location(lats, lons, main_lats[row_codes], main_lons[row_codes])
+        far &= has_station & multiple_locations[row_codes]
+        
+        # Nomenclatura solo para los sectores lejanos (en orden de fila)
+        for i in np.flatnonzero(far):
+            station_id = station_ids[codes[i]]
+            cell_id = cell_id_values[i]
+            if not station_id or _compile_pattern(str(station_id)).match(str(cell_id)) is None:
                 continue
             
-            # Calcular distancia
-            distance = self.calculate_distance(main_lat, main_lon, cell_lat, cell_lon)
+            extended_cells.setdefault(station_id, []).append(str(cell_id))
+            self._log_extended_cell(cell_id, distances[i])
+        
+        return extended_cells
+    
+    def _isin_sorted(self, values: pd.Series, targets: List[str]) -> np.ndarray:
+        """
+        Máscara de pertenencia de values a targets por búsqueda binaria
+        
+        Args:
+            values: Serie de cell_id
+            targets: Lista de cell_id buscados
             
-            if distance is None:
-                continue
+        Returns:
+            Array booleano (como Series.isin)
+        """
+        array = values.to_numpy(dtype=object)
+        sorted_targets = np.asarray(targets, dtype=object)
+        
+        try:
+            sorted_targets = np.unique(sorted_targets)
+            positions = np.searchsorted(sorted_targets, array)
+        except TypeError:
+            # Tipos no comparables entre sí (p.ej. NaN junto a texto): usar hashing
+            return values.isin(targets).to_numpy()
+        
+        positions = np.minimum(positions, len(sorted_targets) - 1)
+        return (sorted_targets[positions] == array).astype(bool)
+    
+    def _find_cell_id_col(self, columns) -> Optional[str]:
+        """
+        Determina la columna de identificación de celda
+        
+        Args:
+            columns: Columnas del DataFrame
             
-            # Si está lejos de la ubicación principal
-            if distance > self.distance_threshold:
-                extended_cells.append(str(cell_id))
-                distance_km = distance * 111  # Aproximación: 1° ≈ 111km
-                self.logger.info(
-                    f"  🔄 Sector extendido detectado: {cell_id} "
-                    f"(distancia: {distance:.4f}° ≈ {distance_km:.1f}km de ubicación principal)"
-                )
+        Returns:
+            Nombre de la columna o None
+        """
+        for possible_col in ['station_cell_id', 'cell_id', 'sector_id']:
+            if possible_col in columns:
+                return possible_col
+        return None
+    
+    def _far_from_main_location(self, lats: np.ndarray, lons: np.ndarray,
+                                main_lats, main_lons) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Marca los sectores más allá del umbral respecto a su ubicación principal
         
-        return extended_cells
+        Args:
+            lats, lons: Coordenadas de los sectores
+            main_lats, main_lons: Ubicación principal (escalar o una por sector)
+            
+        Returns:
+            Tupla (máscara de sectores lejanos, distancia para el log: km en
+            haversine, grados² en euclidiana). NaN nunca supera el umbral.
+        """
+        if self.distance_method == 'haversine':
+            distances_km = _haversine_km(lats, lons, main_lats, main_lons)
+            return distances_km > self._threshold_km, distances_km
+        
+        squared_distances = (lats - main_lats)**2 + (lons - main_lons)**2
+        return squared_distances > self._threshold_sq, squared_distances
+    
+    def _log_extended_cell(self, cell_id, distance: float):
+        """
+        Registra un sector extendido detectado
+        
+        Args:
+            cell_id: ID del sector
+            distance: Distancia devuelta por _far_from_main_location
+        """
+        # Sin INFO activo no se calcula la distancia ni se formatea el mensaje
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        
+        # La raíz solo se calcula para los sectores detectados
+        if self.distance_method == 'haversine':
+            distance_km = distance
+            distance = distance_km / KM_PER_DEGREE
+        else:
+            distance = np.sqrt(distance)
+            distance_km = distance * KM_PER_DEGREE  # Aproximación: 1° ≈ 111km
+        
+        self.logger.info(
+            "  🔄 Sector extendido detectado: %s (distancia: %.4f° ≈ %.1fkm de ubicación principal)",
+            cell_id, distance, distance_km
+        )
     
-    def mark_extended_cells(self, df: pd.DataFrame, extended_cells_list: List[str]) -> pd.DataFrame:
+    def mark_extended_cells(self, df: pd.DataFrame, extended_cells_list: List[str],
+                            rows: Optional[np.ndarray] = None) -> pd.DataFrame:
         """
-        Marca sectores como Extended Cell en el DataFrame
+        Marca sectores como Extended Cell en el DataFrame (modifica df en el lugar)
         
         Args:
             df: DataFrame de parámetros físicos
             extended_cells_list: Lista de cell_id que son extended cells
+            rows: Posiciones de fila a revisar (opcional, por defecto todas)
             
         Returns:
-            DataFrame modificado con cell_type actualizado
+            El mismo DataFrame con cell_type actualizado
         """
         if not extended_cells_list or len(df) == 0:
             return df
         
         # Determinar columna de cell_id
-        cell_id_col = None
-        for possible_col in ['station_cell_id', 'cell_id', 'sector_id']:
-            if possible_col in df.columns:
-                cell_id_col = possible_col
-                break
+        cell_id_col = self._find_cell_id_col(df.columns)
         
         if not cell_id_col:
             self.logger.debug("No se encontró columna de cell_id para marcar extended cells")
@@ -192,12 +400,28 @@ class ExtendedCellDetector:
             self.logger.debug("Columna 'cell_type' no existe, no se pueden marcar extended cells")
             return df
         
-        # Marcar celdas extendidas
-        mask = df[cell_id_col].isin(extended_cells_list)
-        cells_marked = mask.sum()
+        # Marcar celdas extendidas (solo en las filas indicadas, si las hay)
+        if rows is None:
+            rows = np.arange(len(df))
+        cell_ids = df.iloc[rows, df.columns.get_loc(cell_id_col)]
+        target_rows = rows[self._isin_sorted(cell_ids, extended_cells_list)]
+        cells_marked = len(target_rows)
         
         if cells_marked > 0:
-            df.loc[mask, 'cell_type'] = 'Extended Cell'
+            mask = np.zeros(len(df), dtype=bool)
+            mask[target_rows] = True
+            
+            # Columna nueva en un solo buffer contiguo (sin setitem por bloques)
+            cell_types = df['cell_type']
+            if isinstance(cell_types.dtype, pd.CategoricalDtype):
+                # En columnas categóricas solo se escriben códigos; agregar la categoría si falta
+                if EXTENDED_CELL_TYPE not in cell_types.cat.categories:
+                    cell_types = cell_types.cat.add_categories([EXTENDED_CELL_TYPE])
+                code = cell_types.cat.categories.get_loc(EXTENDED_CELL_TYPE)
+                codes = np.where(mask, code, cell_types.cat.codes.to_numpy())
+                df['cell_type'] = pd.Categorical.from_codes(codes, dtype=cell_types.dtype)
+            else:
+                df['cell_type'] = np.where(mask, EXTENDED_CELL_TYPE, cell_types.to_numpy(dtype=object))
             self.logger.info(f"  ✓ {cells_marked} sectores marcados como Extended Cell")
         
         return df
\ No newline at end of file
@@ -1,8 +1,43 @@
 import pandas as pd
 import numpy as np
 import logging
+from collections import Counter
+from functools import lru_cache
 from difflib import SequenceMatcher
 from typing import Optional, List, Dict, Any
+from src.utils import (
+    EXCEL_READ_ENGINE,
+    get_cache_dir,
+    load_template_cache,
+    remove_template_cache,
+    save_template_cache
+)
+
+# Similitud de cadenas en C++ (opcional); si no está instalado se usa difflib
+try:
+    from rapidfuzz import fuzz, process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
+def _normalize_name(name) -> str:
+    """Normaliza un nombre para compararlo: minúsculas, sin puntuación ni espacios extra"""
+    normalized = str(name).lower().strip()
+    normalized = normalized.replace('.', '').replace(',', '').replace('-', ' ')
+    return ' '.join(normalized.split())
+
+@lru_cache(maxsize=4096)
+def _name_ratio(n1: str, n2: str) -> float:
+    """Similitud (0.0-1.0) entre dos nombres ya normalizados, memorizada por par"""
+    if RAPIDFUZZ_AVAILABLE:
+        return fuzz.ratio(n1, n2) / 100.0
+    return SequenceMatcher(None, n1, n2).ratio()
+
+# Parámetros rellenables cuyo valor de referencia se precalcula por estación al cargar el template
+REFERENCE_PARAMETERS = ['structure_owner', 'structure_type', 'tx_type']
+
+# Parámetros con valor de referencia precalculado (los rellenables más el nombre)
+PRECOMPUTED_PARAMETERS = REFERENCE_PARAMETERS + ['name']
 
 class TemplateManager:
     """
@@ -19,35 +54,140 @@ class TemplateManager:
             config: Diccionario de configuración del sistema
         """
         self.config = config
+        # Nombres de referencia ya resueltos {(station_id, candidatos): nombre}
+        self._name_cache = {}
         self.logger = logging.getLogger(__name__)
         
         try:
             self.logger.info(f"Cargando template de referencia: {template_file}")
-            # Cargar template (puede tener una o múltiples hojas)
-            self.template_sheets = pd.read_excel(template_file, sheet_name=None)
-            self.logger.info(f"Template cargado con {len(self.template_sheets)} hoja(s)")
-            
-            # Consolidar todas las hojas en un solo DataFrame para búsqueda
-            self.df_template = pd.concat(self.template_sheets.values(), ignore_index=True)
-            self.logger.info(f"Template consolidado: {len(self.df_template)} filas")
+            # Template consolidado de una ejecución anterior (mismo mtime y tamaño del Excel),
+            # solo si el caché está activado en la configuración
+            cache_dir = get_cache_dir(config)
+            cached = self._load_cached_template(template_file, cache_dir) if cache_dir else None
+            if cached is not None:
+                self.template_sheets = {}
+                self.df_template = cached
+                self.logger.info(f"Template cargado desde caché: {len(self.df_template)} filas")
+            else:
+                # Cargar template (puede tener una o múltiples hojas); sin calamine pandas
+                # ya abre el libro con openpyxl en modo read_only/data_only
+                self.template_sheets = pd.read_excel(template_file, sheet_name=None, engine=EXCEL_READ_ENGINE)
+                self.logger.info(f"Template cargado con {len(self.template_sheets)} hoja(s)")
+                
+                # Consolidar todas las hojas en un solo DataFrame para búsqueda
+                self.df_template = pd.concat(self.template_sheets.values(), ignore_index=True)
+                self.logger.info(f"Template consolidado: {len(self.df_template)} filas")
+                
+                if cache_dir:
+                    try:
+                        save_template_cache(self.df_template, template_file, cache_dir)
+                    except Exception as e:
+                        self.logger.warning(f"⚠️  No se pudo guardar el caché del template: {e}")
             
-            # Crear índice por station_id para búsqueda rápida
+            # Crear índice por station_id para búsqueda rápida (dict estación -> posiciones de fila)
             if 'station_id' in self.df_template.columns:
-                self.template_by_station = self.df_template.groupby('station_id')
+                self._station_index = self.df_template.groupby('station_id', sort=False).indices
             else:
                 self.logger.warning("Columna 'station_id' no encontrada en template")
-                self.template_by_station = None
+                self._station_index = None
             
         except FileNotFoundError:
             self.logger.error(f"Template no encontrado: {template_file}")
             self.df_template = pd.DataFrame()
-            self.template_by_station = None
+            self._station_index = None
             self.template_sheets = {}
         except Exception as e:
             self.logger.error(f"Error cargando template: {e}")
             self.df_template = pd.DataFrame()
-            self.template_by_station = None
+            self._station_index = None
             self.template_sheets = {}
+        
+        self._build_reference_cache()
+    
+    def _load_cached_template(self, template_file: str, cache_dir: str) -> Optional[pd.DataFrame]:
+        """
+        Carga el template consolidado desde el caché; un caché ilegible cuenta como fallo de caché
+        
+        Args:
+            template_file: Ruta al archivo Excel del template
+            cache_dir: Directorio de caché
+            
+        Returns:
+            DataFrame del template o None (sin caché o caché corrupto, que se borra)
+        """
+        try:
+            return load_template_cache(template_file, cache_dir)
+        except Exception as e:
+            self.logger.warning(f"⚠️  Caché del template ilegible, se vuelve a leer el Excel: {e}")
+            try:
+                remove_template_cache(template_file, cache_dir)
+            except OSError:
+                pass
+            return None
+    
+    def _build_reference_cache(self):
+        """
+        Precalcula el nombre y los valores de referencia de cada estación del template
+        """
+        # {parámetro: {station_id: valor}}, {station_id: nombre} y {station_id: nombre normalizado}
+        self._reference_values = {}
+        self._reference_names = {}
+        self._normalized_template_names = {}
+        
+        # Filas del template ya extraídas {station_id: DataFrame o None} (se reinicia con el caché)
+        self._station_data_cache = {}
+        
+        if self._station_index is None:
+            return
+        
+        for param in PRECOMPUTED_PARAMETERS:
+            if param in self.df_template.columns:
+                self._reference_values[param] = self._reference_values_by_station(param)
+        
+        # Primer nombre no nulo de cada estación
+        if 'name' in self.df_template.columns:
+            first_names = self.df_template.groupby('station_id', sort=False)['name'].first()
+            self._reference_names = first_names.dropna().to_dict()
+            self._normalized_template_names = {
+                station_id: _normalize_name(name) for station_id, name in self._reference_names.items()
+            }
+    
+    def _reference_values_by_station(self, parameter: str) -> Dict:
+        """
+        Calcula el valor de referencia de un parámetro para todas las estaciones
+        
+        Mismo criterio que _compute_reference_value, con agrupaciones por columna.
+        
+        Args:
+            parameter: Nombre del parámetro
+            
+        Returns:
+            Diccionario {station_id: valor o None}
+        """
+        station_ids = self.df_template['station_id']
+        values = self.df_template[parameter]
+        text = values.astype(str)
+        valid = values.notna() & text.str.strip().ne('') & text.ne('-')
+        
+        # Estaciones sin valores válidos: None
+        reference_values = dict.fromkeys(self._station_index)
+        
+        valid_groups = values[valid].groupby(station_ids[valid], sort=False)
+        distinct = valid_groups.nunique()
+        
+        # Un solo valor válido: ese valor
+        single = distinct.index[distinct.eq(1)]
+        reference_values.update(valid_groups.first()[single].to_dict())
+        
+        # Varios: el más frecuente entre los no nulos (en empate, el primero en aparecer)
+        multiple = distinct.index[distinct.gt(1)]
+        if len(multiple) > 0:
+            rows = values.notna() & station_ids.isin(multiple)
+            counts = values[rows].groupby([station_ids[rows], values[rows]], sort=False).size()
+            most_frequent = counts.groupby(level=0, sort=False).idxmax()
+            reference_values.update({station_id: value for station_id, (_, value) in most_frequent.items()})
+        
+        return reference_values
     
     def get_station_data(self, station_id: str) -> Optional[pd.DataFrame]:
         """
@@ -59,21 +199,36 @@ class TemplateManager:
         Returns:
             DataFrame con datos de la estación o None
         """
-        if self.template_by_station is None:
+        if self._station_index is None:
             return None
         
-        try:
-            return self.template_by_station.get_group(station_id)
-        except KeyError:
+        if station_id not in self._station_data_cache:
+            self._station_data_cache[station_id] = self._slice_station_data(station_id)
+        return self._station_data_cache[station_id]
+    
+    def _slice_station_data(self, station_id: str) -> Optional[pd.DataFrame]:
+        """
+        Filas de una estación en el template (ver get_station_data, que memoriza el resultado)
+        
+        Args:
+            station_id: ID de la estación
+            
+        Returns:
+            DataFrame con datos de la estación o None
+        """
+        rows = self._station_index.get(station_id)
+        if rows is None:
             self.logger.debug(f"Estación {station_id} no encontrada en template")
             return None
+        return self.df_template.iloc[rows]
     
-    def calculate_name_similarity(self, name1: str, name2: str) -> float:
+    def calculate_name_similarity(self, name1: str, name2: str, pre_normalized: bool = False) -> float:
         """
-        Calcula similitud entre dos nombres usando SequenceMatcher
+        Calcula similitud entre dos nombres usando rapidfuzz (o SequenceMatcher)
         
         Args:
             name1, name2: Nombres a comparar
+            pre_normalized: Si los nombres ya pasaron por _normalize_name
             
         Returns:
             Valor entre 0.0 (totalmente diferentes) y 1.0 (idénticos)
@@ -81,19 +236,54 @@ class TemplateManager:
         if not name1 or not name2:
             return 0.0
         
-        # Normalizar: minúsculas, sin espacios extra
-        n1 = str(name1).lower().strip()
-        n2 = str(name2).lower().strip()
-        
-        # Remover puntos y caracteres especiales para mejor comparación
-        n1 = n1.replace('.', '').replace(',', '').replace('-', ' ')
-        n2 = n2.replace('.', '').replace(',', '').replace('-', ' ')
+        if pre_normalized:
+            return _name_ratio(name1, name2)
+        return _name_ratio(_normalize_name(name1), _normalize_name(name2))
+    
+    def find_most_similar_name(self, template_name: str, candidate_names: List[str],
+                               normalized_template: Optional[str] = None, score_cutoff: float = 0.0):
+        """
+        Busca el candidato más similar al nombre del template
         
-        # Normalizar espacios múltiples
-        n1 = ' '.join(n1.split())
-        n2 = ' '.join(n2.split())
+        Args:
+            template_name: Nombre del template
+            candidate_names: Lista de nombres candidatos
+            normalized_template: template_name ya normalizado (opcional)
+            score_cutoff: Similitud mínima (0.0-1.0); con rapidfuzz se descartan antes
+                          los candidatos que no pueden alcanzarla
+            
+        Returns:
+            Tupla (mejor candidato o None, similitud); en empate gana el primero
+        """
+        if not template_name:
+            return None, 0.0
+        
+        # El template y cada candidato se normalizan una sola vez fuera del bucle
+        if normalized_template is None:
+            normalized_template = _normalize_name(template_name)
+        choices = [_normalize_name(candidate) if candidate else None for candidate in candidate_names]
+        
+        if RAPIDFUZZ_AVAILABLE:
+            # Todos los candidatos en una sola llamada en C++ (None = candidato vacío, se omite)
+            result = process.extractOne(normalized_template, choices, scorer=fuzz.ratio,
+                                        score_cutoff=score_cutoff * 100)
+            if result is None or result[1] <= 0:
+                return None, 0.0
+            return candidate_names[result[2]], result[1] / 100.0
+        
+        best_match = None
+        best_similarity = 0.0
+        
+        for candidate, normalized in zip(candidate_names, choices):
+            if normalized is None:
+                continue
+            similarity = _name_ratio(normalized_template, normalized)
+            
+            if similarity > best_similarity:
+                best_similarity = similarity
+                best_match = candidate
         
-        return SequenceMatcher(None, n1, n2).ratio()
+        return best_match, best_similarity
     
     def get_reference_name(self, station_id: str, candidate_names: List[str]) -> Optional[str]:
         """
@@ -106,28 +296,118 @@ class TemplateManager:
         Returns:
             Nombre seleccionado o None
         """
-        station_data = self.get_station_data(station_id)
+        # El resultado depende del orden de los candidatos (empates), así que la clave lo conserva
+        try:
+            key = (station_id, tuple(candidate_names or ()))
+            hash(key)
+        except TypeError:
+            return self._select_reference_name(station_id, candidate_names)
+        
+        if key not in self._name_cache:
+            self._name_cache[key] = self._select_reference_name(station_id, candidate_names)
+        return self._name_cache[key]
+    
+    def batch_get_reference_names(self, station_ids: List[str],
+                                  candidate_lists: List[List[str]]) -> List[Optional[str]]:
+        """
+        Obtiene los nombres de referencia de varias estaciones a la vez
+        
+        Con rapidfuzz, las similitudes de todos los pares (template, candidato)
+        se calculan en una sola llamada en C++. Los resultados quedan en la
+        caché de get_reference_name.
         
-        if station_data is None or len(station_data) == 0:
+        Args:
+            station_ids: IDs de las estaciones
+            candidate_lists: Lista de nombres candidatos por estación
+            
+        Returns:
+            Nombre seleccionado (o None) por estación
+        """
+        fuzzy = RAPIDFUZZ_AVAILABLE and self.config['name_similarity']['use_fuzzy_matching']
+        
+        # Estaciones que llegan a la comparación difusa: (posición, clave, inicio de sus pares)
+        pending = []
+        queries = []
+        choices = []
+        results = [None] * len(station_ids)
+        
+        for i, (station_id, candidate_names) in enumerate(zip(station_ids, candidate_lists)):
+            try:
+                key = (station_id, tuple(candidate_names or ()))
+                hash(key)
+            except TypeError:
+                results[i] = self._select_reference_name(station_id, candidate_names)
+                continue
+            
+            if key in self._name_cache:
+                results[i] = self._name_cache[key]
+                continue
+            
+            template_name = self._reference_names.get(station_id)
+            if not (fuzzy and template_name and candidate_names) or template_name in candidate_names:
+                results[i] = self._name_cache[key] = self._select_reference_name(station_id, candidate_names)
+                continue
+            
+            pending.append((i, key, len(queries)))
+            normalized_template = self._normalized_template_names[station_id]
+            for candidate in candidate_names:
+                queries.append(normalized_template)
+                # Candidato vacío: similitud 0 (como calculate_name_similarity)
+                choices.append(_normalize_name(candidate) if candidate else None)
+        
+        if pending:
+            scores = process.cpdist(queries, [c if c is not None else '' for c in choices],
+                                    scorer=fuzz.ratio, workers=-1)
+            scores[np.array([c is None for c in choices])] = 0
+            
+            for i, key, start in pending:
+                station_id, candidate_names = key
+                station_scores = scores[start:start + len(candidate_names)]
+                best = int(station_scores.argmax())  # En empate, el primero
+                if station_scores[best] > 0:
+                    best_match = (candidate_names[best], float(station_scores[best]) / 100.0)
+                else:
+                    best_match = (None, 0.0)
+                
+                results[i] = self._name_cache[key] = self._select_reference_name(
+                    station_id, candidate_lists[i], best_match
+                )
+        
+        return results
+    
+    def _select_reference_name(self, station_id: str, candidate_names: List[str],
+                               best_match=None) -> Optional[str]:
+        """
+        Selecciona el nombre de referencia (ver get_reference_name)
+        
+        Args:
+            station_id: ID de la estación
+            candidate_names: Lista de nombres candidatos
+            best_match: (candidato, similitud) ya calculados (opcional)
+            
+        Returns:
+            Nombre seleccionado o None
+        """
+        if self._station_index is None or station_id not in self._station_index:
             self.logger.debug(f"Sin datos en template para {station_id}, usando algoritmo por defecto")
             return None
         
-        # Obtener nombre(s) del template
-        if 'name' not in station_data.columns:
+        # Obtener nombre del template (el primero no nulo, precalculado)
+        if 'name' not in self.df_template.columns:
             self.logger.debug(f"Columna 'name' no encontrada en template para {station_id}")
             return None
         
-        template_names = station_data['name'].dropna().unique().tolist()
+        template_name = self._reference_names.get(station_id)
         
-        if not template_names:
+        if template_name is None:
             return None
         
-        template_name = template_names[0]  # Usar el primero
-        
         if not candidate_names:
             return template_name
         
-        # Si el nombre del template está en los candidatos, usarlo
+        # Si el nombre del template está en los candidatos, usarlo (una sola búsqueda
+        # lineal por combinación estación/candidatos: el resultado queda en _name_cache,
+        # así que armar un set costaría lo mismo y fallaría con candidatos no hashables)
         if template_name in candidate_names:
             self.logger.info(f"  ✓ Nombre del template encontrado: {template_name}")
             return template_name
@@ -136,15 +416,14 @@ class TemplateManager:
         if self.config['name_similarity']['use_fuzzy_matching']:
             threshold = self.config['name_similarity']['similarity_threshold']
             
-            best_match = None
-            best_similarity = 0.0
-            
-            for candidate in candidate_names:
-                similarity = self.calculate_name_similarity(template_name, candidate)
-                
-                if similarity > best_similarity:
-                    best_similarity = similarity
-                    best_match = candidate
+            if best_match is None:
+                # El umbral se pasa con un margen mínimo: la decisión final es la
+                # comparación de abajo, sin depender del redondeo de threshold * 100
+                best_match = self.find_most_similar_name(
+                    template_name, candidate_names, self._normalized_template_names.get(station_id),
+                    score_cutoff=max(threshold - 1e-9, 0.0)
+                )
+            best_match, best_similarity = best_match
             
             if best_similarity >= threshold:
                 self.logger.info(
@@ -152,6 +431,12 @@ class TemplateManager:
                     f"(similitud: {best_similarity:.2%} con template: {template_name})"
                 )
                 return best_match
+            elif best_match is None:
+                # Con rapidfuzz los candidatos bajo el umbral ni siquiera se puntúan
+                self.logger.warning(
+                    f"  ⚠️  Ningún nombre candidato es similar al template "
+                    f"(ninguno alcanza {threshold:.2%})"
+                )
             else:
                 self.logger.warning(
                     f"  ⚠️  Ningún nombre candidato es similar al template "
@@ -173,29 +458,46 @@ class TemplateManager:
         Returns:
             Valor de referencia o None
         """
+        # Parámetros precalculados al cargar el template
+        reference_values = self._reference_values.get(parameter)
+        if reference_values is not None:
+            return reference_values.get(station_id)
+        
         station_data = self.get_station_data(station_id)
         
-        if station_data is None or parameter not in station_data.columns:
+        if station_data is None:
             return None
         
-        # Obtener valores únicos no nulos
-        values = station_data[parameter].dropna().unique().tolist()
+        return self._compute_reference_value(station_data, parameter)
+    
+    def _compute_reference_value(self, station_data: pd.DataFrame, parameter: str) -> Optional[Any]:
+        """
+        Calcula el valor de referencia de un parámetro en las filas de una estación
         
-        if not values:
+        Args:
+            station_data: DataFrame con las filas de la estación en el template
+            parameter: Nombre del parámetro
+            
+        Returns:
+            Valor más frecuente (ignorando vacíos) o None
+        """
+        if parameter not in station_data.columns:
             return None
         
-        # Filtrar valores vacíos o inválidos
-        values = [v for v in values if str(v).strip() != '' and str(v) != '-']
+        # Valores no nulos, sin vacíos ni '-' (filtro por columna)
+        values = station_data[parameter].dropna()
+        text = values.astype(str)
+        valid = values[text.str.strip().ne('') & text.ne('-')]
         
-        if not values:
+        if valid.empty:
             return None
         
-        # Si hay múltiples valores, retornar el más frecuente
-        if len(values) > 1:
-            value_counts = station_data[parameter].value_counts()
-            return value_counts.index[0]
+        # Si hay múltiples valores, retornar el más frecuente (conteo en una pasada;
+        # en empate most_common conserva el primero en aparecer, como value_counts)
+        if valid.nunique() > 1:
+            return Counter(values).most_common(1)[0][0]
         
-        return values[0]
+        return valid.iloc[:1].tolist()[0]
     
     def fill_missing_parameters(self, station_id: str, current_values: Dict) -> Dict:
         """
@@ -211,17 +513,16 @@ class TemplateManager:
             current_values: Dict con valores actuales (puede tener None)
             
         Returns:
-            Dict con valores actualizados
+            Dict con valores actualizados; una copia solo si se rellenó algún
+            parámetro, si no el mismo current_values (no se modifica nunca)
         """
-        fillable_params = ['structure_owner', 'structure_type', 'tx_type']
-        updated_values = current_values.copy()
+        updated_values = None
         
-        station_data = self.get_station_data(station_id)
-        
-        if station_data is None:
-            return updated_values
+        # Basta con saber si la estación está en el template (los valores están precalculados)
+        if self._station_index is None or station_id not in self._station_index:
+            return current_values
         
-        for param in fillable_params:
+        for param in REFERENCE_PARAMETERS:
             # Si el valor actual es None o vacío
             current_val = current_values.get(param)
             
@@ -236,12 +537,14 @@ class TemplateManager:
                 template_value = self.get_reference_value(station_id, param)
                 
                 if template_value:
+                    if updated_values is None:
+                        updated_values = dict(current_values)
                     updated_values[param] = template_value
                     self.logger.info(
                         f"  ✓ Parámetro '{param}' rellenado desde template: {template_value}"
                     )
         
-        return updated_values
+        return updated_values if updated_values is not None else current_values
     
     def is_available(self) -> bool:
         """
@@ -250,4 +553,4 @@ class TemplateManager:
         Returns:
             True si el template está disponible
         """
-        return self.template_by_station is not None and len(self.df_template) > 0
\ No newline at end of file
+        return self._station_index is not None and len(self.df_template) > 0
\ No newline at end of file
@@ -1,19 +1,79 @@
 import os
+import glob
+import hashlib
 import yaml
-from datetime import datetime
+import time
 import shutil
+import pickle
 import logging
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from openpyxl import load_workbook
 
+# Lector Excel en Rust (opcional); si no está instalado se usa openpyxl
+try:
+    from python_calamine import CalamineWorkbook
+    CALAMINE_AVAILABLE = True
+except ImportError:
+    CALAMINE_AVAILABLE = False
+
+# Engine para pd.read_excel (engine='calamine' existe desde pandas 2.2)
+PANDAS_VERSION = tuple(int(part) for part in pd.__version__.split('.')[:2])
+EXCEL_READ_ENGINE = 'calamine' if CALAMINE_AVAILABLE and PANDAS_VERSION >= (2, 2) else 'openpyxl'
+
+# Textos que pd.read_excel convierte en NaN por defecto (na_values de pandas);
+# las lecturas en streaming los tratan igual para obtener los mismos valores
+PANDAS_NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+])
+
+# Escritor Excel en streaming (opcional); si no está instalado se usa openpyxl
+try:
+    import xlsxwriter  # noqa: F401
+    XLSXWRITER_AVAILABLE = True
+except ImportError:
+    XLSXWRITER_AVAILABLE = False
+
+# Engine para pd.ExcelWriter
+EXCEL_WRITE_ENGINE = 'xlsxwriter' if XLSXWRITER_AVAILABLE else 'openpyxl'
+
+# Opciones de xlsxwriter: los strings se escriben tal cual (sin detectar
+# números, fórmulas ni URLs celda por celda)
+XLSXWRITER_STRING_OPTIONS = {
+    'strings_to_numbers': False,
+    'strings_to_formulas': False,
+    'strings_to_urls': False
+}
+
+# Strings en memoria Arrow (opcional); en pandas 3 ya es el tipo str por defecto
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Parser YAML en C (libyaml) si PyYAML se compiló con él; si no, el SafeLoader en Python
+try:
+    from yaml import CSafeLoader as YAML_LOADER
+except ImportError:
+    from yaml import SafeLoader as YAML_LOADER
+
+@lru_cache(maxsize=1)
 def load_config(config_path='config/settings.yaml'):
-    """Carga la configuración desde archivo YAML"""
+    """Carga la configuración desde archivo YAML (una sola vez por proceso)"""
     with open(config_path, 'r', encoding='utf-8') as file:
-        return yaml.safe_load(file)
+        return yaml.load(file, Loader=YAML_LOADER)
 
 def setup_logging(log_dir='logs/'):
-    """Configura el sistema de logging"""
+    """Configura el sistema de logging (solo la primera vez en el proceso)"""
+    if logging.getLogger().handlers:
+        return logging.getLogger(__name__)
+    
     os.makedirs(log_dir, exist_ok=True)
     
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    timestamp = get_timestamp()
     log_file = os.path.join(log_dir, f'correction_{timestamp}.log')
     
     logging.basicConfig(
@@ -31,16 +91,163 @@ def create_backup(file_path, backup_dir='data/output/backups/'):
     """Crea backup de un archivo"""
     os.makedirs(backup_dir, exist_ok=True)
     
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    timestamp = get_timestamp()
     filename = os.path.basename(file_path)
     backup_path = os.path.join(backup_dir, f'{timestamp}_{filename}')
     
+    # copy2 ya copia sin pasar por espacio de usuario (os.sendfile en Linux,
+    # fcopyfile en macOS) y luego conserva los metadatos con copystat
     shutil.copy2(file_path, backup_path)
     return backup_path
 
+def read_excel_sheets(file_path, max_workers=8, engine=EXCEL_READ_ENGINE):
+    """Lee todas las hojas de un Excel, parseando cada hoja en un hilo distinto"""
+    if CALAMINE_AVAILABLE:
+        workbook = CalamineWorkbook.from_path(file_path)
+        sheet_names = list(workbook.sheet_names)
+    else:
+        workbook = load_workbook(file_path, read_only=True)
+        sheet_names = workbook.sheetnames
+    workbook.close()
+    
+    if len(sheet_names) <= 1:
+        return pd.read_excel(file_path, sheet_name=None, engine=engine)
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(sheet_names))) as executor:
+        futures = {
+            name: executor.submit(pd.read_excel, file_path, sheet_name=name, engine=engine)
+            for name in sheet_names
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+def iter_sheet_rows(file_path):
+    """Itera (nombre_hoja, filas) de un Excel en streaming, sin crear DataFrames"""
+    if CALAMINE_AVAILABLE:
+        workbook = CalamineWorkbook.from_path(file_path)
+        try:
+            for sheet_name in workbook.sheet_names:
+                yield sheet_name, iter(workbook.get_sheet_by_name(sheet_name).iter_rows())
+        finally:
+            workbook.close()
+        return
+    
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for ws in workbook.worksheets:
+            yield ws.title, ws.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+def get_cache_dir(config):
+    """Directorio de caché si processing.cache_parsed_files está activado, si no None"""
+    if not (config.get('processing') or {}).get('cache_parsed_files', False):
+        return None
+    return (config.get('output_files') or {}).get('cache_dir', 'data/cache/')
+
+def _cache_file(excel_file, cache_dir, suffix):
+    """
+    Ruta del caché de un Excel dentro de cache_dir
+    
+    El nombre lleva un hash de la ruta del Excel y la clave mtime+tamaño, de modo
+    que un Excel reemplazado (aunque tenga fecha anterior) no reutiliza el caché.
+    """
+    source = hashlib.sha1(os.path.abspath(excel_file).encode('utf-8')).hexdigest()[:16]
+    key = f"{os.path.getmtime(excel_file):.0f}_{os.path.getsize(excel_file)}"
+    return os.path.join(cache_dir, f'{source}.{key}.{suffix}')
+
+def _remove_stale_caches(cache_file, suffix):
+    """Borra los cachés del mismo Excel con otra clave mtime+tamaño"""
+    cache_dir, name = os.path.split(cache_file)
+    source = name.split('.', 1)[0]
+    for old_file in glob.glob(os.path.join(glob.escape(cache_dir), f'{source}.*.{suffix}')):
+        if old_file != cache_file:
+            os.remove(old_file)
+
+def _write_cache_atomic(cache_file, write):
+    """
+    Escribe un caché en un temporal y lo mueve a su nombre final con os.replace
+    
+    Una escritura interrumpida deja solo el temporal, nunca un caché truncado
+    con una clave válida.
+    """
+    tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+    try:
+        write(tmp_file)
+        os.replace(tmp_file, cache_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def save_sheets_cache(all_sheets, excel_file, cache_dir):
+    """Guarda las hojas en un pickle en cache_dir para no volver a parsear el Excel"""
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_file = _cache_file(excel_file, cache_dir, 'sheets.pkl')
+    
+    def write(path):
+        with open(path, 'wb') as file:
+            pickle.dump(all_sheets, file, protocol=5)
+    
+    _write_cache_atomic(cache_file, write)
+    _remove_stale_caches(cache_file, 'sheets.pkl')
+
+def load_sheets_cache(excel_file, cache_dir):
+    """
+    Carga las hojas desde el pickle de cache_dir, o None si no existe para esta versión del Excel
+    
+    Un pickle ilegible (truncado o dañado) se borra y cuenta como fallo de caché,
+    de modo que el llamador vuelve a leer el Excel.
+    """
+    cache_file = _cache_file(excel_file, cache_dir, 'sheets.pkl')
+    
+    if not os.path.exists(cache_file):
+        return None
+    
+    try:
+        with open(cache_file, 'rb') as file:
+            return pickle.load(file)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, ValueError, OSError):
+        try:
+            os.remove(cache_file)
+        except OSError:
+            pass
+        return None
+
+def _template_cache_suffix():
+    """Sufijo del caché del template: Parquet si hay pyarrow, si no pickle"""
+    return 'template.parquet' if PYARROW_AVAILABLE else 'template.pkl'
+
+def load_template_cache(excel_file, cache_dir):
+    """Carga el template consolidado desde cache_dir, o None si no existe para esta versión del Excel"""
+    cache_file = _cache_file(excel_file, cache_dir, _template_cache_suffix())
+    
+    if not os.path.exists(cache_file):
+        return None
+    if PYARROW_AVAILABLE:
+        return pd.read_parquet(cache_file, engine='pyarrow')
+    return pd.read_pickle(cache_file)
+
+def remove_template_cache(excel_file, cache_dir):
+    """Borra el caché del template de esta versión del Excel (p. ej. si está corrupto)"""
+    cache_file = _cache_file(excel_file, cache_dir, _template_cache_suffix())
+    if os.path.exists(cache_file):
+        os.remove(cache_file)
+
+def save_template_cache(df_template, excel_file, cache_dir):
+    """Guarda el template consolidado en cache_dir y borra sus cachés obsoletos"""
+    os.makedirs(cache_dir, exist_ok=True)
+    suffix = _template_cache_suffix()
+    cache_file = _cache_file(excel_file, cache_dir, suffix)
+    
+    if PYARROW_AVAILABLE:
+        _write_cache_atomic(cache_file, lambda path: df_template.to_parquet(
+            path, engine='pyarrow', compression='zstd', index=False))
+    else:
+        _write_cache_atomic(cache_file, lambda path: df_template.to_pickle(path, protocol=5))
+    _remove_stale_caches(cache_file, suffix)
+
 def get_timestamp():
-    """Retorna timestamp formateado"""
-    return datetime.now().strftime('%Y%m%d_%H%M%S')
+    """Retorna timestamp formateado (hora local)"""
+    return time.strftime('%Y%m%d_%H%M%S')
 
 def ensure_directories_exist(config):
     """Asegura que todos los directorios necesarios existan"""
@@ -1,6 +1,20 @@
 import pandas as pd
 import numpy as np
 import logging
+from src.utils import EXCEL_WRITE_ENGINE, XLSXWRITER_STRING_OPTIONS
+
+def _in_range(values, vmin, vmax):
+    """
+    Máscara vmin <= v <= vmax de una columna numérica (NaN nunca está en rango)
+
+    La segunda comparación se combina en la máscara de la primera con &=.
+    Toda la columna se convierte con la misma regla: los textos numéricos se
+    comparan como números y los no numéricos quedan fuera de rango.
+    """
+    array = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    mask = np.greater_equal(array, vmin)
+    mask &= array <= vmax
+    return mask
 
 class DataValidator:
     """
@@ -33,31 +47,31 @@ class DataValidator:
         params_to_check = ['latitude', 'longitude', 'name', 
                           'structure_height', 'structure_owner', 'structure_type']
         
-        validation_results = []
-        
-        for station_id in df[station_id_col].unique():
-            mask = df[station_id_col] == station_id
-            station_data = df[mask]
-            
-            result = {'station_id': station_id}
-            
-            for param in params_to_check:
-                if param in df.columns:
-                    unique_values = station_data[param].nunique()
-                    result[f'{param}_unique_count'] = unique_values
-                    result[f'{param}_consistent'] = (unique_values == 1)
-                else:
-                    result[f'{param}_unique_count'] = None
-                    result[f'{param}_consistent'] = None
-            
-            # Verificar si todos los parámetros son consistentes
-            consistency_checks = [result[f'{p}_consistent'] for p in params_to_check if f'{p}_consistent' in result]
-            result['all_consistent'] = all(consistency_checks) if consistency_checks else False
-            result['total_sectors'] = len(station_data)
-            
-            validation_results.append(result)
-        
-        df_validation = pd.DataFrame(validation_results)
+        # Valores únicos por estación en una sola agrupación (en orden de aparición;
+        # un station_id nulo no agrupa filas, por lo que queda con conteos en 0)
+        station_ids = pd.unique(df[station_id_col])
+        present = [p for p in params_to_check if p in df.columns]
+        grouped = df.groupby(station_id_col, sort=False)
+        unique_counts = grouped[present].nunique().reindex(station_ids).fillna(0).astype(np.int64)
+        total_sectors = grouped.size().reindex(station_ids).fillna(0).astype(np.int64)
+        
+        columns = {station_id_col: station_ids}
+        for param in params_to_check:
+            if param in present:
+                columns[f'{param}_unique_count'] = unique_counts[param].to_numpy()
+                columns[f'{param}_consistent'] = unique_counts[param].to_numpy() == 1
+            else:
+                columns[f'{param}_unique_count'] = [None] * len(station_ids)
+                columns[f'{param}_consistent'] = [None] * len(station_ids)
+        
+        # Todos los parámetros deben existir y ser consistentes
+        if len(present) == len(params_to_check):
+            columns['all_consistent'] = (unique_counts[present] == 1).all(axis=1).to_numpy()
+        else:
+            columns['all_consistent'] = np.zeros(len(station_ids), dtype=bool)
+        columns['total_sectors'] = total_sectors.to_numpy()
+        
+        df_validation = pd.DataFrame(columns)
         
         # Estadísticas
         total_stations = len(df_validation)
@@ -85,26 +99,22 @@ class DataValidator:
         lon_min = self.config['geographic_validation']['longitude_min']
         lon_max = self.config['geographic_validation']['longitude_max']
         
-        results = []
+        # Validación por columnas (NaN nunca está dentro del rango)
+        missing = pd.Series(np.nan, index=df.index)
+        lat = df['latitude'] if 'latitude' in df.columns else missing
+        lon = df['longitude'] if 'longitude' in df.columns else missing
         
-        for idx, row in df.iterrows():
-            lat = row.get('latitude')
-            lon = row.get('longitude')
-            station_id = row.get('station_id', idx)
-            
-            lat_valid = lat_min <= lat <= lat_max if pd.notna(lat) else False
-            lon_valid = lon_min <= lon <= lon_max if pd.notna(lon) else False
-            
-            results.append({
-                'station_id': station_id,
-                'latitude': lat,
-                'longitude': lon,
-                'latitude_valid': lat_valid,
-                'longitude_valid': lon_valid,
-                'coordinates_valid': lat_valid and lon_valid
-            })
+        lat_valid = _in_range(lat, lat_min, lat_max)
+        lon_valid = _in_range(lon, lon_min, lon_max)
         
-        df_geo_validation = pd.DataFrame(results)
+        df_geo_validation = pd.DataFrame({
+            'station_id': self._station_ids(df),
+            'latitude': lat.to_numpy(),
+            'longitude': lon.to_numpy(),
+            'latitude_valid': lat_valid,
+            'longitude_valid': lon_valid,
+            'coordinates_valid': lat_valid & lon_valid
+        })
         
         valid_count = df_geo_validation['coordinates_valid'].sum()
         total_count = len(df_geo_validation)
@@ -118,6 +128,20 @@ class DataValidator:
         
         return df_geo_validation
     
+    def _station_ids(self, df):
+        """
+        IDs de estación por fila (o el índice si no existe la columna)
+        
+        Args:
+            df: DataFrame a validar
+            
+        Returns:
+            Array con un ID por fila
+        """
+        if 'station_id' in df.columns:
+            return df['station_id'].to_numpy()
+        return df.index.to_numpy()
+    
     def validate_structure_parameters(self, df):
         """
         Valida parámetros de estructura (altura, tipo, propietario)
@@ -133,30 +157,28 @@ class DataValidator:
         height_min = self.config['structure_validation']['height_min']
         height_max = self.config['structure_validation']['height_max']
         
-        results = []
-        
-        for idx, row in df.iterrows():
-            height = row.get('structure_height')
-            s_type = row.get('structure_type')
-            owner = row.get('structure_owner')
-            station_id = row.get('station_id', idx)
-            
-            height_valid = height_min <= height <= height_max if pd.notna(height) else False
-            type_valid = pd.notna(s_type) and str(s_type).strip() != '' and str(s_type) != '-'
-            owner_valid = pd.notna(owner) and str(owner).strip() != ''
-            
-            results.append({
-                'station_id': station_id,
-                'structure_height': height,
-                'structure_type': s_type,
-                'structure_owner': owner,
-                'height_valid': height_valid,
-                'type_valid': type_valid,
-                'owner_valid': owner_valid,
-                'all_structure_params_valid': height_valid and type_valid and owner_valid
-            })
-        
-        df_structure_validation = pd.DataFrame(results)
+        # Validación por columnas
+        missing = pd.Series(np.nan, index=df.index)
+        height = df['structure_height'] if 'structure_height' in df.columns else missing
+        s_type = df['structure_type'] if 'structure_type' in df.columns else missing
+        owner = df['structure_owner'] if 'structure_owner' in df.columns else missing
+        
+        height_valid = _in_range(height, height_min, height_max)
+        
+        type_text = s_type.astype(str)
+        type_valid = (s_type.notna() & type_text.str.strip().ne('') & type_text.ne('-')).to_numpy(dtype=bool)
+        owner_valid = (owner.notna() & owner.astype(str).str.strip().ne('')).to_numpy(dtype=bool)
+        
+        df_structure_validation = pd.DataFrame({
+            'station_id': self._station_ids(df),
+            'structure_height': height.to_numpy(),
+            'structure_type': s_type.to_numpy(),
+            'structure_owner': owner.to_numpy(),
+            'height_valid': height_valid,
+            'type_valid': type_valid,
+            'owner_valid': owner_valid,
+            'all_structure_params_valid': height_valid & type_valid & owner_valid
+        })
         
         valid_count = df_structure_validation['all_structure_params_valid'].sum()
         total_count = len(df_structure_validation)
@@ -213,8 +235,13 @@ class DataValidator:
         
         df_comparison = pd.DataFrame(comparison)
         
-        # Guardar reporte
-        with pd.ExcelWriter(report_file, engine='xlsxwriter') as writer:
+        # Guardar reporte (constant_memory de xlsxwriter no sirve aquí: pandas
+        # escribe columna por columna y ese modo descarta celdas fuera de orden)
+        writer_kwargs = {}
+        if EXCEL_WRITE_ENGINE == 'xlsxwriter':
+            writer_kwargs['engine_kwargs'] = {'options': XLSXWRITER_STRING_OPTIONS}
+        
+        with pd.ExcelWriter(report_file, engine=EXCEL_WRITE_ENGINE, **writer_kwargs) as writer:
             df_comparison.to_excel(writer, sheet_name='comparison_summary', index=False)
             original_consistency.to_excel(writer, sheet_name='original_consistency', index=False)
             corrected_consistency.to_excel(writer, sheet_name='corrected_consistency', index=False)
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils import load_config
+from src.correction_engine import RFDataCorrectionEngine
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'settings.yaml')
+
+
+def _sector(station_id, cell_id, lat, lon):
+    return {'station_id': station_id, 'cell_id': cell_id, 'name': station_id,
+            'latitude': lat, 'longitude': lon, 'structure_height': 30.0,
+            'structure_owner': 'OWNER', 'structure_type': 'TORRE'}
+
+
+def _write_physical_file(path):
+    """
+    Hojas con distintas columnas de ID: lte con station_cell_id y sector_id, gsm solo con sector_id
+    """
+    lte_rows = []
+    gsm_rows = []
+    # Estaciones solo en lte, solo en gsm y en ambas; la última sector de cada una está lejos
+    for station_id, rows in (('L010', lte_rows), ('G040', gsm_rows), ('M070', lte_rows), ('M070', gsm_rows)):
+        for n in range(3):
+            rows.append(_sector(station_id, f'{station_id}_{n}', 4.60, -74.08))
+        rows.append(_sector(station_id, f'{station_id}R1', 4.70, -74.20))
+
+    df_lte = pd.DataFrame(lte_rows).rename(columns={'cell_id': 'station_cell_id'})
+    df_lte['sector_id'] = df_lte['station_cell_id'] + 'S'
+    df_gsm = pd.DataFrame(gsm_rows).rename(columns={'cell_id': 'sector_id'})
+
+    with pd.ExcelWriter(path) as writer:
+        df_lte.to_excel(writer, sheet_name='lte', index=False)
+        df_gsm.to_excel(writer, sheet_name='gsm', index=False)
+
+
+def _per_station(engine, station_id):
+    """Detección estación por estación sobre sus filas concatenadas (flujo original)"""
+    parts = [engine.all_sheets[sheet_name].iloc[rows]
+             for sheet_name, rows in engine.get_station_locations(station_id)]
+    station_df = pd.concat(parts, ignore_index=True)
+    return engine.extended_detector.detect_extended_cells_in_station(station_df)
+
+
+def test_batch_detection_uses_each_station_id_column(tmp_path):
+    physical_file = str(tmp_path / 'physical.xlsx')
+    _write_physical_file(physical_file)
+
+    engine = RFDataCorrectionEngine(physical_file, load_config(CONFIG_PATH))
+    station_ids = ['L010', 'G040', 'M070']
+
+    batch = engine.detect_extended_cells_batch(station_ids)
+
+    # La estación solo en gsm se detecta por sector_id
+    assert batch['G040'] == ['G040R1']
+    for station_id in station_ids:
+        assert batch.get(station_id, []) == _per_station(engine, station_id)
@@ -0,0 +1,49 @@
+import copy
+import glob
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils import load_config
+from src.template_manager import TemplateManager
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'settings.yaml')
+
+
+def _cache_config(cache_dir):
+    config = copy.deepcopy(load_config(CONFIG_PATH))
+    config['processing']['cache_parsed_files'] = True
+    config['output_files']['cache_dir'] = cache_dir
+    return config
+
+
+def test_truncated_template_cache_falls_back_to_excel(tmp_path):
+    template_file = str(tmp_path / 'template.xlsx')
+    pd.DataFrame({
+        'station_id': ['S001', 'S001', 'S002'],
+        'name': ['ALFA', 'ALFA', 'BETA'],
+        'latitude': [4.60, 4.60, 6.25],
+        'longitude': [-74.08, -74.08, -75.56]
+    }).to_excel(template_file, index=False)
+    config = _cache_config(str(tmp_path / 'cache'))
+
+    # Primera carga: lee el Excel y escribe el caché
+    expected = TemplateManager(template_file, config).df_template
+    cache_files = glob.glob(str(tmp_path / 'cache' / '*.template.*'))
+    assert len(cache_files) == 1
+
+    # Caché truncado (escritura interrumpida o archivo dañado)
+    with open(cache_files[0], 'r+b') as file:
+        file.truncate(16)
+
+    manager = TemplateManager(template_file, config)
+
+    assert manager.is_available()
+    pd.testing.assert_frame_equal(manager.df_template, expected)
+    # El caché se reescribe completo y la siguiente carga lo usa
+    reloaded = TemplateManager(template_file, config)
+    assert reloaded.template_sheets == {}
+    pd.testing.assert_frame_equal(reloaded.df_template, expected)